@@ -0,0 +1,280 @@
+"""
+Benchmarks of the generation, conversion and attack stages.
+
+Run from the repository root:
+
+    python -m scripts.benchmark --sizes 8000 80000 800000 --output bench.json
+    python -m scripts.benchmark --output bench_new.json --compare bench.json
+
+For every stage the wall time (best of `--repeat`), peak RSS during the stage and edges/sec are
+reported. Stages which need graph-tool are skipped when it is not installed (the CSR stages run
+without it).
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.append('..')
+from scripts.parallel import seed_global_rngs
+from scripts.instrumentation import MemorySampler
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def measure(fn, interval=0.005):
+    """
+    Run `fn` and sample RSS in a background thread
+
+    :return: (result of fn, wall time in seconds, peak RSS in bytes)
+    """
+    sampler = MemorySampler(interval).start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        wall = time.perf_counter() - start
+        peak = sampler.stop()
+    return result, wall, peak
+
+
+class PreparedStage:
+    """
+    Stage measured without the preparation of its input (e.g. generation of the attacked graph)
+    """
+
+    def __init__(self, prepare, run, count=None):
+        self.prepare = prepare
+        self.run = run
+        self.count = count or (lambda g: g.num_edges())
+
+
+def attack_stages(generate, suffix=''):
+    """
+    Attacks of a graph returned by `generate` (graph-tool graph or CSRGraph), stage names end with `suffix`
+    """
+    from scripts import random_attacks as ra
+    from scripts.giant_connected_component import size_gcc
+
+    def on(run):
+        return PreparedStage(generate, run)
+
+    return [
+        ('size_gcc' + suffix, on(size_gcc)),
+        ('get_rescaled_gcc_size_after_random_attack_node' + suffix,
+         on(lambda g: ra.get_rescaled_gcc_size_after_random_attack(g, 0.5, 'node'))),
+        ('get_rescaled_gcc_size_after_random_attack_edge' + suffix,
+         on(lambda g: ra.get_rescaled_gcc_size_after_random_attack(g, 0.5, 'edge'))),
+        ('get_rescaled_gcc_size_after_intentional_attack' + suffix,
+         on(lambda g: ra.get_rescaled_gcc_size_after_intentional_attack(g, 0.1))),
+    ]
+
+
+def network_stages(N: int, k: float):
+    """
+    Stages on ER and BA networks of size N
+
+    :return: list of (stage name, function returning the number of processed edges or PreparedStage),
+        reason why the graph-tool stages are skipped (None if they are not)
+    """
+    from scripts.random_edges import gnp_edges
+    from scripts.percolation import rescaled_gcc_curve
+    from scripts import random_attacks as ra
+    ps = np.linspace(0, 1, 50)
+    p_er = k / (N - 1)
+    m = max(1, round(k / 2))
+
+    def er_edges():
+        return gnp_edges(N, p_er)
+
+    def curve(*args, **kwargs):
+        return PreparedStage(er_edges, lambda edges: rescaled_gcc_curve(edges, N, ps, *args, **kwargs), count=len)
+
+    stages = [
+        ('gnp_edges', lambda: len(er_edges())),
+        ('newman_ziff_random_node', curve(True, 'node')),
+        ('newman_ziff_random_edge', curve(True, 'edge')),
+        ('newman_ziff_intentional', curve(False)),
+        ('newman_ziff_adaptive', curve(False, adaptive=True)),
+        ('erdos_renyi_csr', lambda: ra.erdos_renyi_graph(N, p_er, 'csr').num_edges()),
+        ('barabasi_albert_csr', lambda: ra.barabasi_albert_graph(N, m, 'csr').num_edges()),
+    ]
+    stages += attack_stages(lambda: ra.erdos_renyi_graph(N, p_er, 'csr'), '_csr')
+    # generate_network and random_attacks import without graph-tool
+    if importlib.util.find_spec('graph_tool') is None:
+        return stages, 'graph-tool stages skipped: graph_tool is not installed'
+    from scripts import generate_network as gn
+
+    if N <= 8000:
+        # O(N^2) interpreter calls
+        stages.append(('erdos_renyi_v1', lambda: gn.erdos_renyi_v1(N, p_er).num_edges()))
+    stages += [
+        ('erdos_renyi_v2', lambda: gn.erdos_renyi_v2(N, p_er).num_edges()),
+        ('erdos_renyi_v3', lambda: gn.erdos_renyi_v3(N, p_er).num_edges()),
+        ('barabasi_albert', lambda: gn.barabasi_albert(N, m).num_edges()),
+    ]
+    stages += attack_stages(lambda: gn.erdos_renyi_v3(N, p_er))
+    return stages, None
+
+
+def hrg_stages(dendrogram_path: str):
+    """
+    Stages on HRG generated from a dendrogram file
+    """
+    from scripts import hrg
+    from scripts import random_attacks as ra
+
+    dendrogram = hrg.load_dendrogram(dendrogram_path)
+
+    def nx_graph():
+        return hrg.generate_hrg(dendrogram, to_gt=False)[0]
+
+    def csr_graph():
+        return ra.hrg_graph(dendrogram, 'csr'), None
+
+    stages = [
+        ('generate_hrg_edges', lambda: len(hrg.generate_hrg_edges(dendrogram)[0])),
+        ('generate_hrg_networkx', lambda: nx_graph().number_of_edges()),
+        ('hrg_graph_csr', lambda: ra.hrg_graph(dendrogram, 'csr').num_edges()),
+        ('get_rescaled_gcc_size_after_random_attack_edge_modified_hrg_csr',
+         PreparedStage(csr_graph, lambda g: ra.get_rescaled_gcc_size_after_random_attack_edge_modified_hrg(*g, 0.5),
+                       count=lambda g: g[0].num_edges())),
+        ('get_rescaled_gcc_size_after_intentional_attack_modified_hrg_csr',
+         PreparedStage(csr_graph, lambda g: ra.get_rescaled_gcc_size_after_intentional_attack_modified_hrg(*g, 0.1),
+                       count=lambda g: g[0].num_edges())),
+    ]
+    if importlib.util.find_spec('graph_tool') is None:
+        return stages, 'graph-tool stages skipped: graph_tool is not installed'
+    from scripts.convert_graphs import nx2gt
+
+    return stages + [
+        ('generate_hrg', lambda: hrg.generate_hrg(dendrogram)[0].num_edges()),
+        ('nx2gt', PreparedStage(nx_graph, lambda g: nx2gt(g), count=lambda g: g.number_of_edges())),
+        ('get_rescaled_gcc_size_after_random_attack_edge_modified_hrg',
+         PreparedStage(lambda: hrg.generate_hrg(dendrogram),
+                       lambda g: ra.get_rescaled_gcc_size_after_random_attack_edge_modified_hrg(*g, 0.5),
+                       count=lambda g: g[0].num_edges())),
+        ('get_rescaled_gcc_size_after_intentional_attack_modified_hrg',
+         PreparedStage(lambda: hrg.generate_hrg(dendrogram),
+                       lambda g: ra.get_rescaled_gcc_size_after_intentional_attack_modified_hrg(*g, 0.1),
+                       count=lambda g: g[0].num_edges())),
+    ], None
+
+
+def run_stage(stage, repeat: int, seed: int):
+    walls = []
+    peak = 0
+    edges = 0
+    for i in range(repeat):
+        seed_global_rngs(np.random.SeedSequence([seed, i]))
+        if isinstance(stage, PreparedStage):
+            g = stage.prepare()
+            edges = stage.count(g)
+            _, wall, rss = measure(lambda: stage.run(g))
+        else:
+            edges, wall, rss = measure(stage)
+        walls.append(wall)
+        peak = max(peak, rss)
+    wall = min(walls)
+    return {'wall': wall, 'peak_rss': peak, 'edges': int(edges), 'edges_per_sec': edges / wall if wall > 0 else None}
+
+
+def run_benchmarks(sizes, k=6., dendrograms=None, repeat=3, seed=0, stages=None):
+    """
+    :param sizes: numbers of nodes of ER/BA networks
+    :param k: average degree of ER/BA networks
+    :param dendrograms: dendrogram files (default all files in data/)
+    :param repeat: number of repetitions of every stage (the best wall time is reported)
+    :param seed: seed of every stage
+    :param stages: names of stages to run (default all)
+    :return: list of results (dicts)
+    """
+    if dendrograms is None:
+        dendrograms = sorted(glob.glob(os.path.join(DATA_DIR, '*.txt')))
+    cases = [({'N': N, 'k': k}, network_stages(N, k)) for N in sizes]
+    cases += [({'dendrogram': os.path.basename(path)}, hrg_stages(path)) for path in dendrograms]
+
+    results = []
+    for params, (case_stages, skipped) in cases:
+        if skipped:
+            print(f'{params}: {skipped}', file=sys.stderr)
+        for name, stage in case_stages:
+            if stages is not None and name not in stages:
+                continue
+            result = dict(params, stage=name, **run_stage(stage, repeat, seed))
+            print(format_result(result), file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def case_key(result):
+    return result['stage'], result.get('N'), result.get('dendrogram')
+
+
+def format_result(result):
+    case = f"N={result['N']}" if 'N' in result else result['dendrogram']
+    rate = result['edges_per_sec']
+    rate = f'{rate:12.0f}' if rate is not None else ' ' * 12
+    return f"{result['stage']:<64} {case:<30} {result['wall']:10.4f} s {result['peak_rss'] / 2 ** 20:9.1f} MB " \
+           f"{rate} edges/s"
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare wall times with a baseline
+
+    :param threshold: relative slowdown reported as a regression
+    :return: list of (key, baseline wall, new wall, ratio) of regressions
+    """
+    base = {case_key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(case_key(r))
+        if b is None:
+            continue
+        ratio = r['wall'] / b['wall'] if b['wall'] > 0 else np.inf
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        print(f'{r["stage"]:<64} {str(case_key(r)[1:]):<30} {b["wall"]:10.4f} -> {r["wall"]:10.4f} s '
+              f'x{ratio:6.2f} {flag}')
+        if flag:
+            regressions.append((case_key(r), b['wall'], r['wall'], ratio))
+    return regressions
+
+
+def machine_info():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8000, 80000, 800000])
+    parser.add_argument('--k', type=float, default=6.)
+    parser.add_argument('--dendrograms', nargs='*', default=None, help='dendrogram files (default data/*.txt)')
+    parser.add_argument('--stages', nargs='*', default=None, help='names of stages to run (default all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file with results')
+    parser.add_argument('--compare', help='JSON file with baseline results')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown treated as regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.k, args.dendrograms, args.repeat, args.seed, args.stages)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'machine': machine_info(), 'seed': args.seed, 'results': results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
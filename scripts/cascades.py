@@ -0,0 +1,209 @@
+"""
+Motter-Lai cascades of overload failures (A. E. Motter and Y.-C. Lai, Phys. Rev. E 66, 065102 (2002)).
+
+The load of a node is its betweenness and its capacity is (1 + alpha) times the initial load. After an
+initial attack removes a fraction p of nodes, the load is redistributed over the remaining graph and
+every node above its capacity fails, wave after wave until no node is overloaded. N*/N is the size of
+GCC of the final graph over the size of the intact graph.
+
+Loads are estimated from a fixed sample of `n_samples` sources (the same in every wave, so the noise
+of the estimate does not trigger failures by itself) and recomputed after a wave only in the connected
+components which lost nodes; the loads of the other components do not change.
+"""
+import sys
+from functools import partial
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+sys.path.append('..')
+from scripts.hrg import load_dendrogram, total_size, avg_degree
+from scripts.random_attacks import cached_generate, erdos_renyi_graph, barabasi_albert_graph, hrg_graph, \
+    simulate_attack, attack_meta, graph_csr, strategy_arguments
+from scripts.strategies import adjacency_matrix, dependencies, strategy_order
+from scripts.network_cache import file_hash
+import scripts.instrumentation as instrumentation
+
+
+def component_labels(indptr, indices, active):
+    return connected_components(adjacency_matrix(indptr, indices, active), directed=False)[1]
+
+
+def loads(indptr, indices, active, sources, scale: float, nodes=None, load=None):
+    """
+    Loads (estimated betweenness) of the active nodes
+
+    :param sources: sampled sources, only the active ones are used
+    :param scale: number of nodes of the intact graph over the number of sampled sources
+    :param nodes: boolean mask of nodes whose load is recomputed (default all), the sources are restricted
+        to these nodes, so they must be unions of connected components
+    :param load: previous loads, updated in place at `nodes`
+    """
+    mask = active if nodes is None else active & nodes
+    new = dependencies(indptr, indices, active, sources[mask[sources]]) * scale / 2
+    if load is None:
+        return new
+    load[mask] = new[mask]
+    return load
+
+
+def redistribute(indptr, indices, state, failed, sources, scale: float):
+    """
+    Remove the failed nodes and recompute the loads in the connected components which lost nodes
+
+    :param state: (active, load, component labels of the active nodes), not modified
+    :return: new state
+    """
+    active, load, labels = state
+    active = active.copy()
+    active[failed] = False
+    affected = np.isin(labels, labels[failed])
+    with instrumentation.stage('cascade_wave', failed=len(failed)):
+        load = loads(indptr, indices, active, sources, scale, affected, load.copy())
+    return active, load, component_labels(indptr, indices, active)
+
+
+def cascade(indptr, indices, removed, capacity, initial_load, sources, scale: float, tolerance=1e-9, attacked=None):
+    """
+    Cascade of failures after the removal of the given nodes
+
+    :param capacity: capacities of nodes
+    :param initial_load: loads of the intact graph
+    :param tolerance: relative margin of the capacity (rounding of recomputed loads is not a failure)
+    :param attacked: state after the removal of `removed` (see `redistribute`), it does not depend on the
+        capacity, so cascades of many capacities share it
+    :return: boolean mask of nodes which survive, number of waves (the initial removal is the first)
+    """
+    N = len(indptr) - 1
+    if not len(removed):
+        return np.ones(N, dtype=bool), 0
+    if attacked is None:
+        attacked = attack_state(indptr, indices, removed, initial_load, sources, scale)
+    state = attacked
+    waves = 1
+    while True:
+        active, load, _ = state
+        failed = np.flatnonzero(active & (load > capacity + tolerance * np.maximum(capacity, 1)))
+        instrumentation.count('cascade_failures', len(failed))
+        if not len(failed):
+            return active, waves
+        state = redistribute(indptr, indices, state, failed, sources, scale)
+        waves += 1
+
+
+def attack_state(indptr, indices, removed, initial_load, sources, scale: float):
+    """
+    State (see `redistribute`) after the removal of the given nodes from the intact graph
+    """
+    N = len(indptr) - 1
+    active = np.ones(N, dtype=bool)
+    return redistribute(indptr, indices, (active, initial_load, component_labels(indptr, indices, active)),
+                        np.asarray(removed, dtype=np.int64), sources, scale)
+
+
+def gcc_fraction(indptr, indices, active) -> float:
+    """
+    Size of GCC of the active nodes over the number of all nodes
+    """
+    N = len(indptr) - 1
+    if not active.any():
+        return 0.
+    labels = component_labels(indptr, indices, active)
+    return np.bincount(labels[active]).max() / N
+
+
+def cascade_realisation(generate, ps, alphas, random_attack=True, strategy='degree', adaptive=False,
+                        n_samples=256):
+    """
+    N*/N after the cascade at every alpha of `alphas` and p of `ps` for a single realisation. The initial
+    loads and the order of the initial attack are computed once and shared by all alphas and ps (the
+    initial attack removes prefixes of one order), the loads after the initial attack by all alphas.
+
+    :param generate: function returning a new graph (graph-tool or CSRGraph), or a tuple (graph, ...)
+    :param ps: fractions of nodes removed by the initial attack
+    :param alphas: tolerance parameters, capacity is (1 + alpha) times the initial load
+    :param random_attack: random initial attack or removal of the nodes ranked by `strategy`
+    :param n_samples: number of sampled sources of loads (None is exact betweenness, O(N E) per wave)
+    :return: list of len(alphas) * len(ps), N*/N at every p for the first alpha, then the second...
+    """
+    g = generate()
+    g = g[0] if isinstance(g, tuple) else g
+    N = g.num_vertices()
+    indptr, indices = graph_csr(g)
+    if random_attack:
+        order = np.random.permutation(N)
+    else:
+        order = strategy_order(strategy, indptr, indices, adaptive=adaptive,
+                               **strategy_arguments(g, None, strategy))
+    sources = np.arange(N) if n_samples is None or n_samples >= N else \
+        np.sort(np.random.choice(N, n_samples, replace=False))
+    scale = N / max(len(sources), 1)
+    with instrumentation.stage('initial_load'):
+        initial_load = loads(indptr, indices, np.ones(N, dtype=bool), sources, scale)
+
+    sizes = np.empty((len(alphas), len(ps)))
+    for j, p in enumerate(ps):
+        removed = order[:int(N * p)]
+        # The first redistribution of loads does not depend on alpha
+        attacked = attack_state(indptr, indices, removed, initial_load, sources, scale) if len(removed) else None
+        for i, alpha in enumerate(alphas):
+            active, _ = cascade(indptr, indices, removed, (1 + alpha) * initial_load, initial_load, sources, scale,
+                                attacked=attacked)
+            sizes[i, j] = gcc_fraction(indptr, indices, active)
+    return sizes.ravel().tolist()
+
+
+def simulate_cascade(generate, ps, alpha, random_attack, strategy, adaptive, n_samples, ntimes, n_workers, seed,
+                     chunksize, store, meta, return_sizes):
+    """
+    Average `ntimes` realisations of cascades with `simulate_attack`
+
+    :param alpha: tolerance parameter, or a sequence of them (tolerance sweep)
+    :return: mean_sizes, std_sizes of len(ps), or of shape (len(alpha), len(ps)) for a sequence of alphas
+        (sizes of shape (ntimes, len(ps)) or (ntimes, len(alpha), len(ps)) with `return_sizes`)
+    """
+    alphas = np.atleast_1d(alpha).astype(float)
+    realisation = partial(cascade_realisation, generate, ps, alphas, random_attack, strategy, adaptive, n_samples)
+    meta = dict(meta, alpha=alphas.tolist(), n_samples=n_samples)
+    result = simulate_attack(realisation, ntimes, n_workers, seed, chunksize, store, meta, return_sizes)
+    shape = (len(ps),) if np.ndim(alpha) == 0 else (len(alphas), len(ps))
+    if return_sizes:
+        return np.asarray(result).reshape((-1,) + shape)
+    return tuple(np.reshape(r, shape).tolist() for r in result)
+
+
+def simulate_cascade_erdos_renyi(N, p_er, ps, alpha=0.2, random_attack=True, ntimes=1, backend='csr', n_workers=1,
+                                 seed=None, chunksize=1, adaptive=False, cache=None, store=None, return_sizes=False,
+                                 strategy='degree', n_samples=256):
+    """
+    Motter-Lai cascades on ER graphs after an initial attack on a fraction p of nodes, with the
+    arguments of `simulate_attack_erdos_renyi` (see `simulate_cascade` for alpha)
+    """
+    generate = partial(cached_generate, cache, 'erdos_renyi_v3', {'N': N, 'p': p_er},
+                       partial(erdos_renyi_graph, N, p_er, backend), backend)
+    meta = attack_meta('ER', N, p_er * (N - 1), ps, random_attack, 'node', adaptive, backend, strategy,
+                       cascade='motter_lai')
+    return simulate_cascade(generate, ps, alpha, random_attack, strategy, adaptive, n_samples, ntimes, n_workers,
+                            seed, chunksize, store, meta, return_sizes)
+
+
+def simulate_cascade_barabasi_albert(N, ps, m=3, alpha=0.2, random_attack=True, ntimes=1, backend='csr',
+                                     n_workers=1, seed=None, chunksize=1, adaptive=False, cache=None, store=None,
+                                     return_sizes=False, strategy='degree', n_samples=256):
+    generate = partial(cached_generate, cache, 'barabasi_albert', {'N': N, 'm': m},
+                       partial(barabasi_albert_graph, N, m, backend), backend)
+    meta = attack_meta('BA', N, 2 * m, ps, random_attack, 'node', adaptive, backend, strategy, cascade='motter_lai')
+    return simulate_cascade(generate, ps, alpha, random_attack, strategy, adaptive, n_samples, ntimes, n_workers,
+                            seed, chunksize, store, meta, return_sizes)
+
+
+def simulate_cascade_hrg(dendrogram_path: str, ps, alpha=0.2, random_attack=True, ntimes=1, backend='csr',
+                         n_workers=1, seed=None, chunksize=1, adaptive=False, cache=None, store=None,
+                         return_sizes=False, strategy='degree', n_samples=256):
+    dendrogram = load_dendrogram(dendrogram_path)
+    generate = partial(cached_generate, cache, 'hrg', {'dendrogram': file_hash(dendrogram_path)},
+                       partial(hrg_graph, dendrogram, backend), backend)
+    meta = attack_meta('HRG', total_size(dendrogram), avg_degree(dendrogram), ps, random_attack, 'node', adaptive,
+                       backend, strategy, dendrogram=dendrogram_path, cascade='motter_lai')
+    return simulate_cascade(generate, ps, alpha, random_attack, strategy, adaptive, n_samples, ntimes, n_workers,
+                            seed, chunksize, store, meta, return_sizes)
@@ -1,8 +1,20 @@
 """
 Code to convert NetworkX fraph to graph-tools from: https://gist.github.com/bbengfort/a430d460966d64edc6cad71c502d7005
 """
+import numbers
+import sys
+
 import networkx as nx
-import graph_tool as gt
+import numpy as np
+
+try:
+    import graph_tool as gt
+except ImportError:
+    # graph-tool is optional for the CSR backend (see scripts/csr_graph.py)
+    gt = None
+
+sys.path.append('..')
+from scripts.instrumentation import timed
 
 
 def get_prop_type(value, key=None):
@@ -11,24 +23,21 @@ def get_prop_type(value, key=None):
     If a key is provided, it also ensures the key is in a format that can be
     used with the PropertyMap. Returns a tuple, (type name, value, key)
     """
-    if isinstance(key, unicode):
-        # Encode the key as ASCII
-        key = key.encode('ascii', errors='replace')
+    if isinstance(key, bytes):
+        key = key.decode('ascii', errors='replace')
 
     # Deal with the value
-    if isinstance(value, bool):
+    if isinstance(value, (bool, np.bool_)):
         tname = 'bool'
+        value = bool(value)
 
-    elif isinstance(value, int):
+    elif isinstance(value, numbers.Integral):
         tname = 'float'
         value = float(value)
 
-    elif isinstance(value, float):
+    elif isinstance(value, numbers.Real):
         tname = 'float'
-
-    elif isinstance(value, unicode):
-        tname = 'string'
-        value = value.encode('ascii', errors='replace')
+        value = float(value)
 
     elif isinstance(value, dict):
         tname = 'object'
@@ -40,86 +49,98 @@ def get_prop_type(value, key=None):
     return tname, value, key
 
 
-def nx2gt(nxG):
-    """
-    Converts a networkx graph to a graph-tool graph.
+def node_indices(nodes, endpoints):
     """
-    # Phase 0: Create a directed or undirected graph-tool Graph
-    gtG = gt.Graph(directed=nxG.is_directed())
-
-    # Add the Graph properties as "internal properties"
-    for key, value in nxG.graph.items():
-        # Convert the value and key into a type for graph-tool
-        tname, value, key = get_prop_type(value, key)
-
-        prop = gtG.new_graph_property(tname)  # Create the PropertyMap
-        gtG.graph_properties[key] = prop  # Set the PropertyMap
-        gtG.graph_properties[key] = value  # Set the actual value
-
-    # Phase 1: Add the vertex and edge property maps
-    # Go through all nodes and edges and add seen properties
-    # Add the node properties first
-    nprops = set()  # cache keys to only add properties once
-    for node, data in nxG.nodes(data=True):
-
-        # Go through all the properties if not seen and add them.
-        for key, val in data.items():
-            if key in nprops: continue  # Skip properties already added
-
-            # Convert the value and key into a type for graph-tool
-            tname, _, key = get_prop_type(val, key)
-
-            prop = gtG.new_vertex_property(tname)  # Create the PropertyMap
-            gtG.vertex_properties[key] = prop  # Set the PropertyMap
+    Map node ids to contiguous indices (positions in `nodes`), with NumPy if the ids are integers
+    or strings
 
-            # Add the key to the already seen properties
-            nprops.add(key)
+    :param nodes: list of node ids
+    :param endpoints: list of node ids to map
+    :return: np.array of indices of `endpoints`
+    """
+    if all(isinstance(n, numbers.Integral) for n in nodes) or all(isinstance(n, str) for n in nodes):
+        ids = np.array(nodes)
+        order = np.argsort(ids, kind='stable')
+        return order[np.searchsorted(ids, np.array(endpoints, dtype=ids.dtype), sorter=order)]
+    index = {node: i for i, node in enumerate(nodes)}
+    return np.fromiter((index[node] for node in endpoints), dtype=np.int64, count=len(endpoints))
 
-    # Also add the node id: in NetworkX a node can be any hashable type, but
-    # in graph-tool node are defined as indices. So we capture any strings
-    # in a special PropertyMap called 'id' -- modify as needed!
-    gtG.vertex_properties['id'] = gtG.new_vertex_property('string')
 
-    # Add the edge properties second
-    eprops = set()  # cache keys to only add properties once
-    for src, dst, data in nxG.edges(data=True):
+def set_properties(gtG, properties, items, prop_type: str):
+    """
+    Add the property maps of the attributes of vertices or edges, numeric values by array assignment
 
-        # Go through all the edge properties if not seen and add them.
+    :param properties: gtG.vertex_properties or gtG.edge_properties
+    :param items: list of attribute dicts in the order of vertex or edge indices
+    :param prop_type: 'vertex' or 'edge'
+    """
+    new_property = gtG.new_vertex_property if prop_type == 'vertex' else gtG.new_edge_property
+    keys = {}
+    for data in items:
         for key, val in data.items():
-            if key in eprops: continue  # Skip properties already added
-
-            # Convert the value and key into a type for graph-tool
-            tname, _, key = get_prop_type(val, key)
-
-            prop = gtG.new_edge_property(tname)  # Create the PropertyMap
-            gtG.edge_properties[key] = prop  # Set the PropertyMap
-
-            # Add the key to the already seen properties
-            eprops.add(key)
-
-    # Phase 2: Actually add all the nodes and vertices with their properties
-    # Add the nodes
-    vertices = {}  # vertex mapping for tracking edges later
-    for node, data in nxG.nodes(data=True):
-
-        # Create the vertex and annotate for our edges later
-        v = gtG.add_vertex()
-        vertices[node] = v
-
-        # Set the vertex properties, not forgetting the id property
-        data['id'] = str(node)
-        for key, value in data.items():
-            gtG.vp[key][v] = value  # vp is short for vertex_properties
+            if key not in keys:
+                tname, _, name = get_prop_type(val, key)
+                keys[key] = tname, name
+
+    for key, (tname, name) in keys.items():
+        prop = new_property(tname)
+        values = [data.get(key) for data in items]
+        if tname in ('bool', 'float'):
+            prop.a = np.array([0 if value is None else value for value in values],
+                              dtype=float if tname == 'float' else bool)
+        else:
+            if prop_type == 'vertex':
+                descriptors = gtG.vertices()
+            else:
+                descriptors = sorted(gtG.edges(), key=lambda e: gtG.edge_index[e])
+            convert = str if tname == 'string' else (lambda value: value)
+            for descriptor, value in zip(descriptors, values):
+                if value is not None:
+                    prop[descriptor] = convert(value)
+        properties[name] = prop
+
+
+@timed()
+def nx2gt(nxG, ids=False):
+    """
+    Converts a networkx graph to a graph-tool graph. Vertex i of the result is the i-th node of nxG
+    and edges keep the order of nxG.edges().
 
-    # Add the edges
-    for src, dst, data in nxG.edges(data=True):
+    :param nxG: networkx graph
+    :param ids: store the node ids as strings in the vertex property 'id'
+    """
+    gtG = gt.Graph(directed=nxG.is_directed())
 
-        # Look up the vertex structs from our vertices mapping and add edge.
-        e = gtG.add_edge(vertices[src], vertices[dst])
+    # Add the Graph properties as "internal properties"
+    for key, value in nxG.graph.items():
+        tname, value, key = get_prop_type(value, key)
+        gtG.graph_properties[key] = gtG.new_graph_property(tname)
+        gtG.graph_properties[key] = value
+
+    nodes, node_data = zip(*nxG.nodes(data=True)) if len(nxG) > 0 else ((), ())
+    edges = list(nxG.edges(data=True))
+    E = len(edges)
+    gtG.add_vertex(len(nodes))
+    if E > 0:
+        endpoints = node_indices(list(nodes), [node for src, dst, _ in edges for node in (src, dst)])
+        gtG.add_edge_list(endpoints.reshape(E, 2))
+
+    set_properties(gtG, gtG.vertex_properties, node_data, 'vertex')
+    set_properties(gtG, gtG.edge_properties, [data for _, _, data in edges], 'edge')
+    if ids:
+        prop = gtG.new_vertex_property('string')
+        for v, node in zip(gtG.vertices(), nodes):
+            prop[v] = str(node)
+        gtG.vertex_properties['id'] = prop
+    return gtG
 
-        # Add the edge properties
-        for key, value in data.items():
-            gtG.ep[key][e] = value  # ep is short for edge_properties
 
-    # Done, finally!
+@timed()
+def edges2gt(edges, N: int, directed=False):
+    """
+    Converts an edge array of shape (E, 2) to a graph-tool graph with N vertices in a single call
+    """
+    gtG = gt.Graph(directed=directed)
+    gtG.add_vertex(N)
+    gtG.add_edge_list(edges)
     return gtG
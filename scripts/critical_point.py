@@ -0,0 +1,79 @@
+"""
+Adaptive search of the percolation threshold p_c with the simulate_attack_* functions.
+
+The susceptibility chi(p) = N Var(N*/N) over realisations peaks at the transition. A coarse sweep
+locates the peak, then every round halves the bracket, centred at the peak, with a finer grid of ps
+and more realisations, so the simulations are concentrated near p_c instead of the flat parts of
+the curve.
+"""
+import numpy as np
+
+
+def susceptibility(sizes):
+    """
+    Variance of N*/N over realisations (proportional to the susceptibility)
+
+    :param sizes: array of shape (ntimes, len(ps))
+    """
+    return np.var(sizes, axis=0)
+
+
+def peak_position(ps, values):
+    """
+    Position of the maximum of `values`, refined with a parabola through the highest point and its
+    neighbours
+    """
+    ps = np.asarray(ps, dtype=float)
+    i = int(np.argmax(values))
+    if i == 0 or i == len(ps) - 1:
+        return ps[i]
+    y0, y1, y2 = values[i - 1], values[i], values[i + 1]
+    curvature = y0 - 2 * y1 + y2
+    if curvature >= 0:
+        return ps[i]
+    shift = 0.5 * (y0 - y2) / curvature
+    return ps[i] + shift * (ps[i + 1] - ps[i - 1]) / 2
+
+
+def round_seeds(seed, n_rounds: int):
+    if seed is None:
+        return [None] * n_rounds
+    return [child.generate_state(4) for child in np.random.SeedSequence(seed).spawn(n_rounds)]
+
+
+def find_critical_point(simulate, p_range=(0., 1.), n_points=11, ntimes=10, n_rounds=4, ntimes_growth=2,
+                        seed=None, n_bootstrap=1000, confidence=0.95):
+    """
+    Locate p_c by the peak of susceptibility, halving the bracket around the peak in every round
+
+    :param simulate: simulate_attack_* function with fixed model arguments, called as
+        simulate(ps=ps, ntimes=ntimes, seed=seed, return_sizes=True), e.g.
+        partial(simulate_attack_erdos_renyi, N, p_er, backend='newman_ziff')
+    :param p_range: initial bracket of p_c
+    :param n_points: number of ps in every round
+    :param ntimes: number of realisations in the first round
+    :param n_rounds: number of rounds
+    :param ntimes_growth: factor of the number of realisations between rounds
+    :param seed: master seed
+    :param n_bootstrap: number of bootstrap samples of the realisations for the confidence interval
+    :param confidence: confidence level of the interval
+    :return: p_c, (low, high) confidence interval, total number of simulated (p, realisation) pairs
+    """
+    low, high = p_range
+    total = 0
+    for seed_round in round_seeds(seed, n_rounds):
+        ps = np.linspace(low, high, n_points)
+        sizes = np.asarray(simulate(ps=ps, ntimes=ntimes, seed=seed_round, return_sizes=True))
+        total += sizes.size
+        peak = peak_position(ps, susceptibility(sizes))
+        width = (high - low) / 2
+        low = min(max(peak - width / 2, p_range[0]), p_range[1] - width)
+        high = low + width
+        ntimes = int(ntimes * ntimes_growth)
+
+    p_c = peak_position(ps, susceptibility(sizes))
+    rng = np.random.default_rng(seed)
+    estimates = [peak_position(ps, susceptibility(sizes[rng.integers(0, len(sizes), len(sizes))]))
+                 for _ in range(n_bootstrap)]
+    alpha = (1 - confidence) / 2
+    return float(p_c), tuple(float(q) for q in np.quantile(estimates, [alpha, 1 - alpha])), total
@@ -0,0 +1,304 @@
+"""
+Graphs as edge arrays with CSR adjacency, measured with NumPy/SciPy only (no graph-tool).
+
+`CSRGraph` provides the part of the graph-tool interface used by `random_attacks` (num_vertices,
+get_vertices, get_edges, ...), so the attack functions run on either backend. Removing vertices or
+edges returns a view with masks over the vertices and edges of the same arrays, as GraphView does.
+
+Arrays are stored compactly (int32 indices below 2^31 vertices/edge ends, stable edges as a packed
+bitmask), and a graph is saved as a directory of `.npy` files which can be loaded memory-mapped.
+"""
+import copy
+import json
+import os
+import sys
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+sys.path.append('..')
+from scripts.instrumentation import timed
+
+
+def index_dtype(n: int):
+    """
+    Smallest of int32/int64 holding indices up to n
+    """
+    return np.int32 if n < 2 ** 31 else np.int64
+
+
+class CSRGraph:
+    def __init__(self, edges, N: int, stable=None, community=None, vertex_mask=None, edge_mask=None):
+        """
+        :param edges: array of shape (E, 2) of an undirected graph (not copied if of the index dtype)
+        :param N: number of vertices
+        :param stable: boolean array over edges, links between communities of HRG (None if not HRG)
+        :param community: array of community labels of vertices (None if not HRG)
+        :param vertex_mask: boolean array of the vertices in the view (None keeps all)
+        :param edge_mask: boolean array of the edges in the view (None keeps all)
+        """
+        self.edges = np.asarray(edges, dtype=index_dtype(N)).reshape(-1, 2)
+        self.N = N
+        self.stable_bits = None if stable is None else np.packbits(np.asarray(stable, dtype=bool))
+        self.community = community
+        self.vertex_mask = vertex_mask
+        self.edge_mask = edge_mask
+        self._csr = None
+        self._edge_csr = None
+        self._base = None
+
+    def _view(self, vertex_mask, edge_mask):
+        # Shares all arrays (and the CSR adjacency, built once by the base graph) with this graph
+        view = copy.copy(self)
+        view._base = self._base or self
+        view.vertex_mask = vertex_mask
+        view.edge_mask = edge_mask
+        return view
+
+    @property
+    def stable(self):
+        """
+        Boolean array over edges of the links between communities (unpacked from `stable_bits`)
+        """
+        if self.stable_bits is None:
+            return None
+        return np.unpackbits(self.stable_bits, count=len(self.edges)).view(bool)
+
+    def num_vertices(self) -> int:
+        return self.N if self.vertex_mask is None else int(np.count_nonzero(self.vertex_mask))
+
+    def num_edges(self) -> int:
+        return int(np.count_nonzero(self.active_edges()))
+
+    def get_vertices(self):
+        return np.arange(self.N) if self.vertex_mask is None else np.flatnonzero(self.vertex_mask)
+
+    def active_edges(self):
+        """
+        Boolean array over edges which are in the view (both ends kept)
+        """
+        active = np.ones(len(self.edges), dtype=bool) if self.edge_mask is None else self.edge_mask.copy()
+        if self.vertex_mask is not None:
+            active &= self.vertex_mask[self.edges[:, 0]] & self.vertex_mask[self.edges[:, 1]]
+        return active
+
+    def edge_indices(self):
+        if self.edge_mask is None and self.vertex_mask is None:
+            return np.arange(len(self.edges))
+        return np.flatnonzero(self.active_edges())
+
+    def get_edges(self):
+        """
+        Edges of the view (the edge array itself if nothing is removed)
+        """
+        if self.edge_mask is None and self.vertex_mask is None:
+            return self.edges
+        return self.edges[self.edge_indices()]
+
+    def degree(self):
+        """
+        :return: array of degrees of all N vertices (0 for removed vertices)
+        """
+        if self.edge_mask is None and self.vertex_mask is None:
+            return np.diff(self.csr[0])
+        return np.bincount(self.get_edges().ravel(), minlength=self.N)
+
+    def stable_vertices(self):
+        """
+        Boolean array over vertices with at least one link between communities
+        """
+        stable = np.zeros(self.N, dtype=bool)
+        if self.stable_bits is not None:
+            stable[self.edges[self.stable].ravel()] = True
+        return stable
+
+    def remove_vertices(self, vertices):
+        """
+        View without the given vertices, the graph is not modified
+        """
+        vertex_mask = np.ones(self.N, dtype=bool) if self.vertex_mask is None else self.vertex_mask.copy()
+        vertex_mask[vertices] = False
+        return self._view(vertex_mask, self.edge_mask)
+
+    def remove_edges(self, edges):
+        """
+        View without the given edges (edge indices), the graph is not modified
+        """
+        edge_mask = np.ones(len(self.edges), dtype=bool) if self.edge_mask is None else self.edge_mask.copy()
+        edge_mask[edges] = False
+        return self._view(self.vertex_mask, edge_mask)
+
+    @property
+    def csr(self):
+        """
+        (indptr, indices, edge ids) of the full graph: neighbours of vertex v are
+        indices[indptr[v]:indptr[v + 1]], joined by the edges edge_ids[indptr[v]:indptr[v + 1]]
+        """
+        if self._base is not None:
+            return self._base.csr
+        if self._csr is None:
+            E = len(self.edges)
+            src = self.edges.T.ravel()
+            order = np.argsort(src, kind='stable')
+            indices = self.edges[:, ::-1].T.ravel()[order]
+            indptr = np.zeros(self.N + 1, dtype=index_dtype(2 * E))
+            np.cumsum(np.bincount(src, minlength=self.N), out=indptr[1:])
+            # Position in src of the edge i is i (as source) and E + i (as target)
+            order[order >= E] -= E
+            self._csr = indptr, indices, order.astype(index_dtype(E))
+        return self._csr
+
+    @property
+    def edge_csr(self):
+        """
+        (indptr, indices, edge ids) with every edge once, in the row of its first end: half of `csr`, enough
+        for connected components
+        """
+        if self._base is not None:
+            return self._base.edge_csr
+        if self._edge_csr is None:
+            order = np.argsort(self.edges[:, 0], kind='stable').astype(index_dtype(len(self.edges)))
+            indptr = np.zeros(self.N + 1, dtype=index_dtype(len(self.edges)))
+            np.cumsum(np.bincount(self.edges[:, 0], minlength=self.N), out=indptr[1:])
+            self._edge_csr = indptr, self.edges[order, 1], order
+        return self._edge_csr
+
+    def edge_adjacency(self):
+        """
+        scipy.sparse matrix of the view with one entry per edge (from its first to its second end). Entries
+        are float64, which scipy.sparse.csgraph uses without a copy.
+        """
+        indptr, indices, edge_ids = self.edge_csr
+        if self.edge_mask is None and self.vertex_mask is None:
+            return csr_matrix((np.ones(len(indices)), indices, indptr), shape=(self.N, self.N))
+        keep = self.active_edges()[edge_ids]
+        new_indptr = np.concatenate([np.zeros(1, dtype=indptr.dtype), np.cumsum(keep, dtype=indptr.dtype)])[indptr]
+        return csr_matrix((np.ones(new_indptr[-1]), indices[keep], new_indptr), shape=(self.N, self.N))
+
+    def adjacency(self):
+        """
+        scipy.sparse adjacency matrix of the view
+        """
+        indptr, indices, edge_ids = self.csr
+        if self.edge_mask is None and self.vertex_mask is None:
+            return csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(self.N, self.N))
+        keep = self.active_edges()[edge_ids]
+        new_indptr = np.concatenate([np.zeros(1, dtype=indptr.dtype), np.cumsum(keep, dtype=indptr.dtype)])[indptr]
+        return csr_matrix((np.ones(new_indptr[-1], dtype=np.int8), indices[keep], new_indptr),
+                          shape=(self.N, self.N))
+
+    def component_labels(self, method='scipy'):
+        """
+        :param method: 'scipy' (scipy.sparse.csgraph.connected_components) or 'union_find'
+        :return: array of component labels of all N vertices
+        """
+        if method == 'scipy':
+            return connected_components(self.edge_adjacency(), directed=False)[1]
+        elif method == 'union_find':
+            return union_find_labels(self.get_edges(), self.N)
+        raise ValueError(f'Unknown method: {method}')
+
+    def size_gcc(self, method='scipy') -> int:
+        if self.num_vertices() == 0:
+            return 0
+        labels = self.component_labels(method)
+        if self.vertex_mask is not None:
+            labels = labels[self.vertex_mask]
+        return int(np.bincount(labels).max())
+
+    def save(self, path: str):
+        """
+        Save the arrays of the graph (not the masks of a view) to the directory `path`
+        """
+        os.makedirs(path, exist_ok=True)
+        indptr, indices, edge_ids = self.csr
+        arrays = {'edges': self.edges, 'indptr': indptr, 'indices': indices, 'edge_ids': edge_ids,
+                  'stable_bits': self.stable_bits, 'community': self.community}
+        for name, array in arrays.items():
+            if array is not None:
+                np.save(os.path.join(path, f'{name}.npy'), array)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'N': self.N, 'E': len(self.edges)}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode='r'):
+        """
+        Load a graph saved by `save`, with memory-mapped arrays by default (shared between processes
+        through the page cache)
+
+        :param mmap_mode: mode of np.load, None loads the arrays into memory
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        def load_array(name):
+            file = os.path.join(path, f'{name}.npy')
+            return np.load(file, mmap_mode=mmap_mode) if os.path.exists(file) else None
+
+        g = cls(load_array('edges'), meta['N'], community=load_array('community'))
+        g.stable_bits = load_array('stable_bits')
+        g._csr = load_array('indptr'), load_array('indices'), load_array('edge_ids')
+        return g
+
+
+def union_find_labels(edges, N: int):
+    """
+    Component labels by union-find over all edges at once: every round links the root of each edge
+    end to the smaller root (hooking), then compresses all paths (pointer jumping)
+
+    :return: array of the smallest vertex of the component of every vertex
+    """
+    parent = np.arange(N)
+    src = np.asarray(edges[:, 0], dtype=np.int64)
+    dst = np.asarray(edges[:, 1], dtype=np.int64)
+    while True:
+        a, b = parent[src], parent[dst]
+        differ = a != b
+        if not differ.any():
+            return parent
+        src, dst, a, b = src[differ], dst[differ], a[differ], b[differ]
+        np.minimum.at(parent, np.maximum(a, b), np.minimum(a, b))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def stack_graphs(graphs):
+    """
+    Disjoint union of graphs (block-diagonal adjacency), vertices and edges of the graph r follow those
+    of the graphs before it
+
+    :param graphs: list of CSRGraph
+    :return: (CSRGraph, array of the index of the graph of every vertex)
+    """
+    sizes = [g.N for g in graphs]
+    vertex_offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    N = int(vertex_offsets[-1])
+    dtype = index_dtype(N)
+    edges = np.concatenate([g.edges.astype(dtype) + dtype(offset) for g, offset in zip(graphs, vertex_offsets)])
+    return CSRGraph(edges, N), np.repeat(np.arange(len(graphs), dtype=np.int32), sizes)
+
+
+@timed()
+def block_gcc_sizes(view, block, n_blocks: int, method='scipy'):
+    """
+    Size of the largest component in every block of a stacked graph, from a single computation of
+    connected components
+
+    :param view: stacked graph or its view
+    :param block: index of the block of every vertex (from `stack_graphs`)
+    :param n_blocks: number of blocks
+    :return: array of len n_blocks
+    """
+    labels = view.component_labels(method)
+    component_block = np.zeros(len(labels), dtype=np.int64)
+    component_block[labels] = block
+    # Removed vertices are isolated and not counted
+    active = labels if view.vertex_mask is None else labels[view.vertex_mask]
+    component_size = np.bincount(active, minlength=len(labels))
+    gcc = np.zeros(n_blocks, dtype=np.int64)
+    np.maximum.at(gcc, component_block, component_size)
+    return gcc
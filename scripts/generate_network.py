@@ -1,5 +1,16 @@
 import numpy as np
-from graph_tool.all import *
+import sys
+
+try:
+    from graph_tool.all import *
+except ImportError:
+    # Only the edge array generators are available (see scripts/csr_graph.py)
+    pass
+
+sys.path.append('..')
+from scripts.random_edges import gnp_edges
+from scripts.convert_graphs import edges2gt
+from scripts.instrumentation import timed
 
 
 def erdos_renyi_v1(N, p):
@@ -21,5 +32,47 @@ def erdos_renyi_v2(N, p):
     return g
 
 
+@timed()
+def erdos_renyi_edges(N, p, rng=None, dtype=np.int64):
+    """
+    Edges of the exact G(N, p), sampled with geometric skipping in O(N + E)
+
+    :return: array of shape (E, 2)
+    """
+    return gnp_edges(N, p, rng, dtype)
+
+
+@timed()
+def erdos_renyi_v3(N, p):
+    return edges2gt(erdos_renyi_edges(N, p), N)
+
+
+@timed()
 def barabasi_albert(N, m=3):
-    return price_network(N, m=m, directed=False)
\ No newline at end of file
+    return price_network(N, m=m, directed=False)
+
+
+@timed()
+def barabasi_albert_edges(N, m=3, rng=None, dtype=np.int64):
+    """
+    Edges of BA graph without graph-tool: node m links to the nodes 0..m-1, then every new node
+    links to m distinct nodes chosen with probability proportional to their degree
+
+    :return: array of shape (m * (N - m), 2)
+    """
+    rng = np.random if rng is None else rng
+    if N <= m:
+        return np.empty((0, 2), dtype=dtype)
+    # Every node appears in `ends` once per edge end, so a uniform draw from it is proportional to degree
+    ends = list(range(m)) + [m] * m
+    edges = [(m, t) for t in range(m)]
+    for v in range(m + 1, N):
+        targets = set()
+        while len(targets) < m:
+            for u in rng.random(m - len(targets)).tolist():
+                targets.add(ends[int(u * len(ends))])
+        for t in targets:
+            edges.append((v, t))
+            ends.append(t)
+        ends.extend([v] * m)
+    return np.array(edges, dtype=dtype)
@@ -0,0 +1,224 @@
+"""
+Expected N*/N of random graphs with a given degree distribution (configuration model), from the
+generating functions of the degree distribution:
+
+    G0(x) = sum_k p_k x^k,    G1(x) = G0'(x) / G0'(1)
+
+Random removal of nodes (site percolation), edges (bond percolation) and removal of the highest
+degree nodes are solved as in Callaway et al., Phys. Rev. Lett. 85, 5468 (2000). All solvers are
+vectorized over ps.
+"""
+import numpy as np
+import networkx as nx
+import sys
+
+sys.path.append('..')
+from scripts.hrg import load_dendrogram, dendrogram_root, total_size
+
+
+def log_factorial(n: int):
+    """
+    :return: array of log(k!) for k = 0..n
+    """
+    return np.concatenate([[0.], np.cumsum(np.log(np.arange(1, n + 1)))])
+
+
+def degree_distribution(degrees):
+    """
+    Empirical degree distribution
+
+    :param degrees: degree sequence (e.g. g.degree_property_map("total").a)
+    :return: (k, pk)
+    """
+    pk = np.bincount(np.asarray(degrees, dtype=np.int64)).astype(float)
+    return np.arange(len(pk)), pk / pk.sum()
+
+
+def poisson_distribution(mean: float, kmax=None):
+    """
+    Degree distribution of ER graph with <k> = mean
+    """
+    if kmax is None:
+        kmax = int(mean + 10 * np.sqrt(mean) + 10)
+    k = np.arange(kmax + 1)
+    pk = np.exp(k * np.log(mean) - mean - log_factorial(kmax)) if mean > 0 else (k == 0).astype(float)
+    return k, pk / pk.sum()
+
+
+def binomial_distribution(n: int, p: float):
+    k = np.arange(n + 1)
+    if p <= 0 or p >= 1:
+        return k, (k == round(p * n)).astype(float)
+    lf = log_factorial(n)
+    return k, np.exp(lf[n] - lf - lf[::-1] + k * np.log(p) + (n - k) * np.log(1 - p))
+
+
+def barabasi_albert_distribution(m: int, kmax=10 ** 4):
+    """
+    Degree distribution of BA graph: p_k = 2 m (m + 1) / (k (k + 1) (k + 2)) for k >= m
+    """
+    k = np.arange(kmax + 1)
+    pk = np.zeros(kmax + 1)
+    pk[m:] = 2. * m * (m + 1) / (k[m:] * (k[m:] + 1.) * (k[m:] + 2.))
+    return k, pk / pk.sum()
+
+
+def hrg_degree_distribution(dendrogram: nx.Graph):
+    """
+    Degree distribution of HRG generated by `generate_hrg`: in a community of size N_r the degree
+    is Binomial(N_r - 1, p_r) plus, for each ancestor in the dendrogram, Poisson with mean
+    min(p N_1, p N_2) / N_c (links to the other subtree, N_c is the size of own subtree).
+    The community structure itself is ignored by the configuration model.
+    """
+    root = dendrogram_root(dendrogram)
+    tree = nx.bfs_tree(dendrogram, root)
+    sizes = {}
+    for node in nx.dfs_postorder_nodes(tree, root):
+        children = list(tree.successors(node))
+        sizes[node] = dendrogram.nodes[node]['size'] if not children else sum(sizes[c] for c in children)
+
+    # Mean number of links to the other subtree, summed over all ancestors of a community
+    external = {root: 0.}
+    for node in nx.dfs_preorder_nodes(tree, root):
+        children = list(tree.successors(node))
+        if len(children) != 2:
+            continue
+        p = dendrogram.nodes[node]['prob']
+        links = min(int(p * sizes[children[0]]), int(p * sizes[children[1]]))
+        for c in children:
+            external[c] = external[node] + links / sizes[c]
+
+    leaves = nx.get_node_attributes(dendrogram, 'size')
+    distributions = []
+    for node, size in leaves.items():
+        _, intra = binomial_distribution(size - 1, dendrogram.nodes[node]['prob'])
+        _, inter = poisson_distribution(external[node])
+        distributions.append(size * np.convolve(intra, inter))
+    pk = np.zeros(max(map(len, distributions)))
+    for d in distributions:
+        pk[:len(d)] += d
+    return np.arange(len(pk)), pk / total_size(dendrogram)
+
+
+def generating_function(k, pk, x):
+    """
+    G(x) = sum_k p_k x^k for every x of an array (pk of shape (K,) or (len(x), K))
+    """
+    x = np.asarray(x, dtype=float)
+    return (pk * x[:, None] ** k[None, :]).sum(axis=1)
+
+
+def smallest_fixed_point(a, w, k, tol=1e-12, max_iter=1000):
+    """
+    Smallest u in [0, 1] with u = a + sum_j w_j u^k_j, for many equations at once. The right-hand side
+    is convex and increasing, so Newton's method started at u = 0 increases monotonically to the root.
+
+    :param a: array of shape (n,)
+    :param w: weights of shape (n, K) or (K,)
+    :param k: exponents of shape (K,)
+    """
+    a = np.asarray(a, dtype=float)
+    u = np.zeros(len(a))
+    for _ in range(max_iter):
+        f = a + generating_function(k, w, u)
+        df = generating_function(np.maximum(k - 1, 0), w * k, u)
+        slope = df - 1
+        # Past the critical point the slope may vanish, then a plain iteration step is taken
+        step = np.where(slope < -1e-12, u - (f - u) / np.where(slope < -1e-12, slope, -1), f)
+        u_next = np.clip(np.maximum(step, u), 0, 1)
+        if np.max(np.abs(u_next - u), initial=0) < tol:
+            return u_next
+        u = u_next
+    return u
+
+
+def excess_distribution(k, pk):
+    """
+    Exponents and coefficients of G1(x) = G0'(x) / G0'(1)
+    """
+    return k[1:] - 1, k[1:] * pk[1:] / (k * pk).sum()
+
+
+def gcc_random_node(k, pk, ps):
+    """
+    Random removal of a fraction p of nodes: u = 1 - q + q G1(u), S = q (1 - G0(u)), q = 1 - p
+
+    :return: N*/N (rescaled by the initial number of nodes), array of len(ps)
+    """
+    q = 1 - np.asarray(ps, dtype=float)
+    if (k * pk).sum() == 0:
+        return np.zeros(len(q))
+    k1, pk1 = excess_distribution(k, pk)
+    u = smallest_fixed_point(1 - q, q[:, None] * pk1[None, :], k1)
+    return np.maximum(q * (1 - generating_function(k, pk, u)), 0)
+
+
+def gcc_random_edge(k, pk, ps):
+    """
+    Random removal of a fraction p of edges: u = 1 - T + T G1(u), S = 1 - G0(u), T = 1 - p
+
+    :return: N*/N, array of len(ps)
+    """
+    t = 1 - np.asarray(ps, dtype=float)
+    if (k * pk).sum() == 0:
+        return np.zeros(len(t))
+    k1, pk1 = excess_distribution(k, pk)
+    u = smallest_fixed_point(1 - t, t[:, None] * pk1[None, :], k1)
+    return np.maximum(1 - generating_function(k, pk, u), 0)
+
+
+def gcc_degree_targeted(k, pk, ps):
+    """
+    Removal of a fraction p of nodes with the highest degree: nodes of degree k are kept with
+    probability phi_k (1 below the cut-off degree, fractional at it, 0 above),
+    u = 1 - F1(1) + F1(u), S = F0(1) - F0(u)
+
+    :return: N*/N rescaled by the number of remaining nodes, array of len(ps)
+    """
+    ps = np.asarray(ps, dtype=float)
+    if (k * pk).sum() == 0:
+        return np.zeros(len(ps))
+    # Fraction of nodes with a higher degree than k, all of them are removed before degree k
+    above = np.cumsum(pk[::-1])[::-1] - pk
+    # Negligible (subnormal) pk overflow the ratio, which is clipped anyway
+    with np.errstate(over='ignore'):
+        removed = np.clip((ps[:, None] - above[None, :]) / np.where(pk > 0, pk, 1)[None, :], 0, 1)
+    phi = 1 - removed
+
+    k1, pk1 = excess_distribution(k, pk)
+    f1 = phi[:, 1:] * pk1[None, :]
+    u = smallest_fixed_point(1 - f1.sum(axis=1), f1, k1)
+    f0 = phi * pk[None, :]
+    s = np.maximum(f0.sum(axis=1) - generating_function(k, f0, u), 0)
+    remaining = 1 - ps
+    return np.divide(s, remaining, out=np.zeros(len(ps)), where=remaining > 0)
+
+
+def predict_gcc(k, pk, ps, random_attack=True, type='node'):
+    """
+    Expected N*/N with the same arguments and rescaling as the simulate_attack_* functions
+
+    :param k: degrees
+    :param pk: degree distribution
+    :param ps: fractions of removed nodes or edges
+    :param random_attack: random removal of nodes/edges or removal of the highest degree nodes
+    :param type: 'node' or 'edge' (random attack only)
+    :return: np.array of len(ps)
+    """
+    k = np.asarray(k)
+    pk = np.asarray(pk, dtype=float)
+    if not random_attack:
+        return gcc_degree_targeted(k, pk, ps)
+    if type == 'node':
+        return gcc_random_node(k, pk, ps)
+    elif type == 'edge':
+        return gcc_random_edge(k, pk, ps)
+    raise ValueError(f'Unknown attack type: {type}')
+
+
+def predict_gcc_hrg(dendrogram_path: str, ps, random_attack=True, type='node'):
+    """
+    Expected N*/N of HRG (see `hrg_degree_distribution`) with the arguments of `simulate_attack_hrg`
+    """
+    k, pk = hrg_degree_distribution(load_dendrogram(dendrogram_path))
+    return predict_gcc(k, pk, ps, random_attack, type)
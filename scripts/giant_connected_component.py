@@ -1,9 +1,22 @@
-from graph_tool.all import *
+import sys
 
+try:
+    from graph_tool.all import *
+except ImportError:
+    # Only CSRGraph is supported (see scripts/csr_graph.py)
+    pass
 
+sys.path.append('..')
+from scripts.csr_graph import CSRGraph
+from scripts.instrumentation import timed
+
+
+@timed()
 def size_gcc(g):
+    if isinstance(g, CSRGraph):
+        return g.size_gcc()
     if g.num_vertices() > 0:
         u = extract_largest_component(g)
         return u.num_vertices()
     else:
-        return 0
\ No newline at end of file
+        return 0
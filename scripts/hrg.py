@@ -4,7 +4,9 @@ import numpy as np
 import sys
 
 sys.path.append('..')
-from scripts.convert_graphs import nx2gt
+from scripts.convert_graphs import edges2gt
+from scripts.random_edges import gnp_edges, random_pairs_between
+from scripts.instrumentation import timed
 
 
 def load_dendrogram(path: str) -> nx.Graph:
@@ -58,40 +60,151 @@ def avg_degree(dendrogram: nx.Graph) -> float:
     :param dendrogram:
     :return: <k>
     """
+    return float(compile_dendrogram(dendrogram).avg_degree()[0])
 
-    def calc_E(p, N):
-        return p * N * (N - 1) / 2
 
-    d_g = dendrogram.copy()
-    total_E = 0
-    sizes = total_size(dendrogram)
+class CompiledDendrogram:
+    """
+    Dendrogram as arrays, nodes are ordered bottom-up (children before their parent):
 
-    for node in d_g.nodes():
-        n = d_g.nodes[node]
-        if 'prob' in n and 'size' in n:
-            total_E += calc_E(n['prob'], n['size'])
+    names - labels of nodes
+    parent - index of parent (-1 for root)
+    children - indices of both children, shape (n, 2) (-1 for leaves)
+    prob - probability p_r of each node
+    size - number of nodes of the network in the subtree
+    level - depth in the dendrogram (0 for root)
+    """
+
+    def __init__(self, names, parent, children, prob, size, level):
+        self.names = names
+        self.parent = parent
+        self.children = children
+        self.prob = prob
+        self.size = size
+        self.level = level
+        self.leaf = children[:, 0] == -1
+        # Expected edges of a node are linear in its probability:
+        # p N (N - 1) / 2 inside a community, p min(N_1, N_2) between both subtrees
+        child_size = np.where(children >= 0, size[children], 0)
+        self.edge_coefficient = np.where(self.leaf, size * (size - 1) / 2, child_size.min(axis=1))
+        # Indicator of the level of each node, shape (n, number of levels)
+        self.level_indicator = np.eye(level.max() + 1)[level]
+
+    @property
+    def total_size(self) -> int:
+        return int(self.size[self.leaf].sum())
+
+    def probabilities(self, probs=None):
+        """
+        :param probs: batch of probability vectors, shape (B, n) or (n,) (default probabilities of dendrogram)
+        :return: array of shape (B, n)
+        """
+        return np.atleast_2d(self.prob if probs is None else np.asarray(probs, dtype=float))
+
+    def expected_edges(self, probs=None):
+        """
+        :return: expected number of edges created at each node, shape (B, n)
+        """
+        return self.probabilities(probs) * self.edge_coefficient
+
+    def expected_edges_per_level(self, probs=None):
+        """
+        :return: E_i of each level i of the dendrogram, shape (B, number of levels)
+        """
+        return self.expected_edges(probs) @ self.level_indicator
+
+    def avg_degree(self, probs=None):
+        """
+        :return: <k> = 2 E / N for every probability vector, shape (B,)
+        """
+        return 2 * self.expected_edges(probs).sum(axis=1) / self.total_size
+
+    def probabilities_for_degree(self, k, probs=None, tol=1e-12):
+        """
+        Inverse problem: scale each probability vector by a common factor c, so that <k> equals the
+        requested value (probabilities are clipped at 1)
+
+        :param k: requested <k>, scalar or array of shape (B,), a single probability vector is used for all
+        :return: array of shape (B, n)
+        """
+        probs = self.probabilities(probs)
+        k = np.atleast_1d(np.asarray(k, dtype=float))
+        if len(probs) == 1:
+            probs = np.broadcast_to(probs, (len(k), probs.shape[1]))
+        k = np.broadcast_to(k, (len(probs),))
+        max_k = self.avg_degree(np.where(probs > 0, 1., 0.))
+        if np.any(k > max_k + tol):
+            raise ValueError(f'Requested <k> above the maximum {max_k.min()}')
+        # <k> is linear in c until a probability reaches 1, so bisect on c in general, up to the c at which
+        # all probabilities are clipped (<k> = max_k)
+        low = np.zeros(len(probs))
+        high = 1 / probs.min(axis=1, initial=np.inf, where=probs > 0)
+        for _ in range(200):
+            c = (low + high) / 2
+            too_low = self.avg_degree(np.minimum(c[:, None] * probs, 1)) < k
+            low = np.where(too_low, c, low)
+            high = np.where(too_low, high, c)
+            if np.max(high - low) < tol * np.max(high):
+                break
+        result = np.minimum(high[:, None] * probs, 1)
+        achieved = self.avg_degree(result)
+        if not np.allclose(achieved, k, rtol=1e-9, atol=tol):
+            raise ValueError(f'Requested <k> not reached: {k} requested, {achieved} achieved')
+        return result
 
-    while True:
-        for node in sorted(d_g.nodes()):
-            n = d_g.nodes[node]
-            if 'size' not in n:
-                neighbors = list(d_g.neighbors(node))
-                s = []
-                for nn_node in neighbors:
-                    nn = d_g.nodes[nn_node]
-                    if 'size' in nn:
-                        s.append(nn['size'])
-                if len(s) > 1:
-                    d_g.nodes[node]['size'] = sum(s)
-                    total_E += n['prob'] * min(s)
-        if len(nx.get_node_attributes(d_g, 'size')) == nx.number_of_nodes(d_g):
-            break
-
-    return 2 * total_E / sizes
+
+def compile_dendrogram(dendrogram: nx.Graph) -> CompiledDendrogram:
+    root = dendrogram_root(dendrogram)
+    tree = nx.bfs_tree(dendrogram, root)
+    names = list(nx.dfs_postorder_nodes(tree, root))
+    index = {name: i for i, name in enumerate(names)}
+    n = len(names)
+
+    parent = np.full(n, -1, dtype=np.int64)
+    children = np.full((n, 2), -1, dtype=np.int64)
+    prob = np.zeros(n)
+    size = np.zeros(n, dtype=np.int64)
+    level = np.zeros(n, dtype=np.int64)
+    for name, depth in nx.shortest_path_length(tree, root).items():
+        level[index[name]] = depth
+    for i, name in enumerate(names):
+        prob[i] = dendrogram.nodes[name].get('prob', 0.)
+        kids = [index[c] for c in tree.successors(name)]
+        if kids:
+            children[i, :len(kids)] = kids
+            parent[kids] = i
+            size[i] = size[kids].sum()
+        else:
+            size[i] = dendrogram.nodes[name]['size']
+    return CompiledDendrogram(names, parent, children, prob, size, level)
+
+
+def dendrogram_layout(dendrogram: nx.Graph):
+    """
+    Positions of the nodes of the dendrogram as a tree without graphviz: root at the top, leaves evenly
+    spaced at the bottom of their subtrees and internal nodes above the middle of their children
+    """
+    root = dendrogram_root(dendrogram)
+    tree = nx.bfs_tree(dendrogram, root)
+    depth = nx.shortest_path_length(tree, root)
+    x = {}
+    leaves = 0
+    for node in nx.dfs_postorder_nodes(tree, root):
+        children = list(tree.successors(node))
+        if children:
+            x[node] = np.mean([x[c] for c in children])
+        else:
+            x[node] = leaves
+            leaves += 1
+    return {node: (x[node], -depth[node]) for node in tree}
 
 
 def plot_dendrogram(g, ax=None, node_border_color='black', node_border_width=1):
-    pos = graphviz_layout(g, prog='dot')
+    try:
+        pos = graphviz_layout(g, prog='dot')
+    except ImportError:
+        # pygraphviz is not installed
+        pos = dendrogram_layout(g)
     nodes_labels = {k: k for k in list(g.nodes())}
     nx.draw_networkx_labels(g, pos=pos, ax=ax, labels=nodes_labels, font_weight='bold', font_size=20,
                             font_color='white')
@@ -99,7 +212,21 @@ def plot_dendrogram(g, ax=None, node_border_color='black', node_border_width=1):
             edgecolors=node_border_color, linewidths=node_border_width)
 
 
+@timed()
 def generate_hrg(dendrogram: nx.Graph, to_gt=True):
+    """
+    Generate HRG from a dendrogram
+
+    :param dendrogram: dendrogram from `load_dendrogram`
+    :param to_gt: return graph-tool graph (built from `generate_hrg_edges`) with boolean edge and vertex
+        properties `stable` marking the edges between communities and their end nodes, otherwise nx.Graph
+    :return: (graph, edges_between_communities)
+    """
+    if to_gt:
+        edges, between = generate_hrg_edges(dendrogram)
+        g = hrg2gt(edges, between, total_size(dendrogram))
+        return g, list(map(tuple, edges[between].tolist()))
+
     initial_community = {}
 
     start_idx = 0
@@ -118,13 +245,29 @@ def generate_hrg(dendrogram: nx.Graph, to_gt=True):
         edges_between_communities.extend(new_edges_between_communities)
         if len(next_communities) == 1:
             g = list(next_communities.values())[0]
-            if to_gt:
-                return nx2gt(g), edges_between_communities
-            else:
-                return g, edges_between_communities
+            return g, edges_between_communities
         initial_community = next_communities
 
 
+def hrg2gt(edges, between, N: int):
+    """
+    Load HRG edges into a graph-tool graph with boolean edge and vertex properties `stable`
+    marking the edges between communities and their end nodes
+
+    :param edges: array of shape (E, 2)
+    :param between: boolean mask of the edges between communities
+    :param N: number of nodes
+    """
+    g = edges2gt(edges, N)
+    stable = g.new_edge_property('bool')
+    stable.a = between
+    g.ep['stable'] = stable
+    stable_nodes = g.new_vertex_property('bool')
+    stable_nodes.a[np.asarray(edges)[np.asarray(between, dtype=bool)].ravel()] = True
+    g.vp['stable'] = stable_nodes
+    return g
+
+
 def combine_communities(communities: dict, dendrogram: nx.Graph, visited):
     next_communities = {}
     edges_between_communities = []
@@ -159,3 +302,63 @@ def connect_communities(dendrogram: nx.Graph, node, c1, c2) -> (nx.Graph, list):
     new_edges = list(zip(c1_subset, c2_subset))
     g.add_edges_from(new_edges)
     return g, new_edges
+
+
+def dendrogram_root(dendrogram: nx.Graph):
+    """
+    Root of the dendrogram: the only internal node with two neighbours
+    """
+    if nx.number_of_nodes(dendrogram) == 1:
+        return list(dendrogram.nodes())[0]
+    return [node for node, degree in dendrogram.degree() if degree == 2][0]
+
+
+@timed()
+def generate_hrg_edges(dendrogram: nx.Graph, rng=None, dtype=np.int64):
+    """
+    Generate HRG directly as an edge array, without NetworkX graphs. Follows `generate_hrg`:
+    communities at the lowest level are G(N_r, p_r) (sampled with geometric skipping) and at each
+    internal node min(p N_1, p N_2) random pairs between both subtrees are connected.
+    Nodes of the communities are numbered in the same order as in `generate_hrg`.
+
+    :param dendrogram: dendrogram from `load_dendrogram`
+    :param rng: np.random.Generator (default global NumPy RNG)
+    :param dtype: integer type of the edge array
+    :return: (edges, between) - contiguous array of shape (E, 2) which can be loaded with
+        `Graph.add_edge_list` and a boolean mask of the edges between communities
+    """
+    members = {}
+    edges = []
+    between = []
+
+    start_idx = 0
+    for node, size in nx.get_node_attributes(dendrogram, 'size').items():
+        members[node] = np.arange(start_idx, start_idx + size, dtype=dtype)
+        edges.append(gnp_edges(size, dendrogram.nodes[node]['prob'], rng, dtype) + dtype(start_idx))
+        between.append(np.zeros(len(edges[-1]), dtype=bool))
+        start_idx += size
+
+    root = dendrogram_root(dendrogram)
+    tree = nx.bfs_tree(dendrogram, root)
+    for node in nx.dfs_postorder_nodes(tree, root):
+        children = list(tree.successors(node))
+        if len(children) != 2:
+            continue
+        p = dendrogram.nodes[node]['prob']
+        c1 = members.pop(children[0])
+        c2 = members.pop(children[1])
+        k = min(int(p * len(c1)), int(p * len(c2)))
+        edges.append(random_pairs_between(c1, c2, k, rng).astype(dtype, copy=False))
+        between.append(np.ones(len(edges[-1]), dtype=bool))
+        members[node] = np.concatenate([c1, c2])
+
+    return np.ascontiguousarray(np.concatenate(edges), dtype=dtype), np.concatenate(between)
+
+
+def hrg_communities(dendrogram: nx.Graph, dtype=np.int32):
+    """
+    Community labels of the nodes of HRG from `generate_hrg_edges` (index of the lowest level
+    community, nodes of a community are numbered consecutively)
+    """
+    sizes = list(nx.get_node_attributes(dendrogram, 'size').values())
+    return np.repeat(np.arange(len(sizes), dtype=dtype), sizes)
@@ -0,0 +1,258 @@
+"""
+Optional runtime instrumentation of the simulations: per-stage timers, counters, peak memory and a
+JSON-lines event log.
+
+Disabled by default, then `stage` returns a shared no-op context manager and `count` / `timed`
+functions only check a global, so the hooks can stay in the hot paths. Enable it around a sweep:
+
+    instrumentation.enable('events.jsonl', sample_memory=True)
+    simulate_attack_hrg(...)
+    print(instrumentation.summary())
+
+Workers of `parallel.run_realisations` are enabled with the same configuration and append to the same
+log (one line per event, tagged with the pid). Counters are written to the log by `flush`, after every
+task of the workers; `summarise_log` aggregates the log of all processes.
+"""
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+import pandas as pd
+
+# Recorder of this process (None if disabled)
+recorder = None
+_disabled = nullcontext()
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size of this process
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemorySampler:
+    """
+    Peak RSS sampled by a background thread every `interval` seconds
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._running = False
+        self._thread = None
+
+    def _sample(self):
+        while self._running:
+            self.peak = max(self.peak, rss_bytes())
+            time.sleep(self.interval)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> int:
+        """
+        :return: peak RSS in bytes
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+        return self.peak
+
+
+class Recorder:
+    def __init__(self, log_path=None, sample_memory=False, interval=0.05):
+        """
+        :param log_path: JSON-lines file receiving every event (appended, None keeps only the totals)
+        :param sample_memory: sample peak RSS in a background thread (RSS is added to stage events)
+        :param interval: sampling interval of RSS in seconds
+        """
+        self.config = {'log_path': log_path, 'sample_memory': sample_memory, 'interval': interval}
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.pending = {}
+        self.log = open(log_path, 'a', buffering=1) if log_path is not None else None
+        self.memory = MemorySampler(interval).start() if sample_memory else None
+
+    def event(self, event: str, **fields):
+        if self.log is not None:
+            self.log.write(json.dumps(dict(fields, event=event, time=time.time(), pid=os.getpid()),
+                                      default=str) + '\n')
+
+    @contextmanager
+    def stage(self, name: str, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            calls, total = self.stages.get(name, (0, 0.))
+            self.stages[name] = calls + 1, total + wall
+            if self.memory is not None:
+                fields['rss'] = rss_bytes()
+            self.event('stage', name=name, wall=wall, **fields)
+
+    def count(self, name: str, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        self.pending[name] = self.pending.get(name, 0) + n
+
+    def peak_rss(self):
+        return self.memory.peak if self.memory is not None else None
+
+    def flush(self):
+        """
+        Write the counters added since the last flush to the log
+        """
+        if self.pending:
+            self.event('counters', counters=self.pending, peak_rss=self.peak_rss())
+            self.pending = {}
+
+    def close(self):
+        if self.memory is not None:
+            self.memory.stop()
+        self.flush()
+        self.event('summary', elapsed=time.perf_counter() - self.start, peak_rss=self.peak_rss())
+        if self.log is not None:
+            self.log.close()
+
+
+def enable(log_path=None, sample_memory=False, interval=0.05) -> Recorder:
+    """
+    Start recording in this process (replaces the current recorder), see `Recorder`
+    """
+    global recorder
+    disable()
+    recorder = Recorder(log_path, sample_memory, interval)
+    return recorder
+
+
+def enable_worker(config):
+    """
+    Enable recording in a worker process with the `config` of the parent (None leaves it disabled). The
+    recorder inherited by fork is dropped without closing, it belongs to the parent.
+    """
+    global recorder
+    recorder = None
+    if config is not None:
+        enable(**config)
+
+
+def disable():
+    """
+    Stop recording, the summary of the recorder is written to its log
+    """
+    global recorder
+    if recorder is not None:
+        recorder.close()
+        recorder = None
+
+
+def enabled() -> bool:
+    return recorder is not None
+
+
+def config():
+    """
+    Configuration of the current recorder for `enable` (None if disabled), e.g. to enable workers
+    """
+    return dict(recorder.config) if recorder is not None else None
+
+
+def stage(name: str, **fields):
+    """
+    Context manager timing the stage `name`, extra fields are added to its event
+    """
+    if recorder is None:
+        return _disabled
+    return recorder.stage(name, **fields)
+
+
+def count(name: str, n=1):
+    """
+    Add n to the counter `name`
+    """
+    if recorder is not None:
+        recorder.count(name, n)
+
+
+def flush():
+    if recorder is not None:
+        recorder.flush()
+
+
+def timed(name=None):
+    """
+    Decorator timing every call of a function as the stage `name` (default the function name)
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if recorder is None:
+                return function(*args, **kwargs)
+            with recorder.stage(stage_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary() -> pd.DataFrame:
+    """
+    Calls, total and mean wall time of every stage and the rates of counters (per second of the time
+    since `enable`) of this process
+    """
+    if recorder is None:
+        return pd.DataFrame()
+    elapsed = time.perf_counter() - recorder.start
+    rows = [{'name': name, 'calls': calls, 'wall': total, 'mean_wall': total / calls}
+            for name, (calls, total) in recorder.stages.items()]
+    rows += [{'name': name, 'count': n, 'per_sec': n / elapsed} for name, n in recorder.counters.items()]
+    df = pd.DataFrame(rows)
+    df.attrs['peak_rss'] = recorder.peak_rss()
+    return df
+
+
+def load_events(path: str):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarise_log(path: str) -> pd.DataFrame:
+    """
+    Per-stage calls, total/mean/max wall time and peak RSS over all processes writing to the log, with
+    the flushed counters of all processes (rates per second of the wall time of the log)
+    """
+    events = load_events(path)
+    stages = pd.DataFrame([e for e in events if e['event'] == 'stage'])
+    if len(stages):
+        if 'rss' not in stages:
+            stages['rss'] = None
+        df = stages.groupby('name').agg(calls=('wall', 'size'), wall=('wall', 'sum'), mean_wall=('wall', 'mean'),
+                                        max_wall=('wall', 'max'), peak_rss=('rss', 'max')).reset_index()
+    else:
+        df = pd.DataFrame()
+    elapsed = max(e['time'] for e in events) - min(e['time'] for e in events) if events else 0.
+    counters = {}
+    for e in events:
+        if e['event'] == 'counters':
+            for name, n in e['counters'].items():
+                counters[name] = counters.get(name, 0) + n
+    rows = [{'name': name, 'count': n, 'per_sec': n / elapsed if elapsed > 0 else None}
+            for name, n in counters.items()]
+    return pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
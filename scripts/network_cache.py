@@ -0,0 +1,121 @@
+"""
+On-disk cache of generated networks, so that different attacks can share the same realisations.
+
+Every entry is a directory named by the hash of generator name, parameters and seed, holding one
+`.npy` file per array (memory-mapped when loaded) and `meta.json`. When the total size exceeds
+`max_size` the least recently used entries are removed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def file_hash(path: str) -> str:
+    """
+    SHA-256 of the content of a file (e.g. dendrogram)
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def seed_key(seed):
+    """
+    JSON-serializable description of a seed (int or np.random.SeedSequence)
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return [str(seed.entropy), list(seed.spawn_key)]
+    return seed
+
+
+class EnsembleCache:
+    def __init__(self, path: str, max_size=10 * 2 ** 30):
+        """
+        :param path: directory of the cache
+        :param max_size: maximal total size in bytes
+        """
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, generator: str, params: dict, seed) -> str:
+        """
+        :param generator: name of the generator
+        :param params: parameters of the generator (JSON-serializable), use `file_hash` for files
+        :param seed: int or np.random.SeedSequence
+        """
+        description = json.dumps({'generator': generator, 'params': params, 'seed': seed_key(seed)},
+                                  sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def load(self, key: str):
+        """
+        :return: (arrays, meta) with memory-mapped arrays, or None if the key is not cached
+        """
+        entry = os.path.join(self.path, key)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+                      for name in meta['arrays']}
+            # Mark as recently used
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return arrays, meta
+
+    def store(self, key: str, arrays: dict, meta=None):
+        """
+        :param arrays: dict of name -> np.array
+        :param meta: additional JSON-serializable metadata
+        """
+        meta = dict(meta or {}, arrays=sorted(arrays))
+        tmp = tempfile.mkdtemp(dir=self.path, prefix='.tmp-')
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp, os.path.join(self.path, key))
+        except OSError:
+            # Stored in the meantime by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """
+        :return: list of (last use, size in bytes, path) of all entries
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in `max_size`
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
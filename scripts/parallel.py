@@ -0,0 +1,135 @@
+"""
+Parallel Monte Carlo runner for the realisations of attack simulations.
+
+Every realisation gets its own child of `np.random.SeedSequence(seed)`, so for a given master seed
+the results do not depend on the number of workers nor on the chunk size.
+"""
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+import numpy as np
+from tqdm import tqdm
+
+sys.path.append('..')
+import scripts.instrumentation as instrumentation
+
+# Seed sequence of the realisation running in this process (None if not seeded)
+current_seed_sequence = None
+
+
+def seed_global_rngs(seed_sequence: np.random.SeedSequence):
+    """
+    Seed the global RNGs used by the generators and attacks (NumPy legacy and graph-tool)
+    """
+    np.random.seed(seed_sequence.generate_state(1)[0])
+    if 'graph_tool' in sys.modules:
+        sys.modules['graph_tool'].seed_rng(int(seed_sequence.generate_state(1, np.uint64)[0] >> 1))
+
+
+def init_worker(instrumentation_config=None):
+    # One OpenMP thread per worker, otherwise the pool oversubscribes the cores
+    if 'graph_tool' in sys.modules:
+        sys.modules['graph_tool'].openmp_set_num_threads(1)
+    instrumentation.enable_worker(instrumentation_config)
+
+
+@contextmanager
+def seeded_realisation(seed_sequence):
+    """
+    Run the body as the realisation with `seed_sequence` (seeds the global RNGs unless None)
+    """
+    global current_seed_sequence
+    current_seed_sequence = seed_sequence
+    if seed_sequence is not None:
+        seed_global_rngs(seed_sequence)
+    try:
+        yield
+    finally:
+        current_seed_sequence = None
+
+
+def run_realisation(realisation, seed_sequence):
+    with seeded_realisation(seed_sequence), instrumentation.stage('realisation'):
+        return np.asarray(realisation(), dtype=float)
+
+
+def run_group(realisation, batch, seed_sequences):
+    if batch is None:
+        sizes = [run_realisation(realisation, seed_sequences[0])]
+    else:
+        with instrumentation.stage('batch', size=len(seed_sequences)):
+            sizes = np.asarray(batch(seed_sequences), dtype=float)
+    instrumentation.count('realisations', len(sizes))
+    # Counters of workers reach the log only by flushing
+    instrumentation.flush()
+    return sizes
+
+
+def run_realisations(realisation, ntimes: int, seed=None, n_workers=1, chunksize=1, store=None, batch=None):
+    """
+    Run `ntimes` independent realisations, optionally on a process pool
+
+    :param realisation: picklable function without arguments returning N*/N for every p
+    :param ntimes: number of realisations
+    :param seed: master seed (int, sequence of ints or np.random.SeedSequence), if None the global RNGs are
+        left untouched in the serial run
+    :param n_workers: number of processes (1 runs in the current process, None uses all cores)
+    :param chunksize: number of realisations sent to a worker at once (or run by one call of `batch`)
+    :param store: ResultsStore, every finished realisation is appended to it and realisations
+        already stored are not run again (the master seed is kept in the store, see `ResultsStore.master_seed`)
+    :param batch: picklable function running many realisations at once, called with the list of their
+        seed sequences (see `seeded_realisation`) and returning an array of shape (len, len(ps));
+        used instead of `realisation` if given
+    :return: np.array of shape (ntimes, len(ps))
+    """
+    if store is not None:
+        seed = store.master_seed(seed)
+    if seed is None and n_workers != 1:
+        # Forked workers would otherwise share the same global RNG state
+        seed = np.random.SeedSequence()
+    if seed is None:
+        seeds = [None] * ntimes
+    elif isinstance(seed, np.random.SeedSequence):
+        # A fresh copy, children already spawned from `seed` must not shift the realisations
+        seeds = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key).spawn(ntimes)
+    else:
+        seeds = np.random.SeedSequence(seed).spawn(ntimes)
+
+    done = set(store.completed()) if store is not None else set()
+    todo = [i for i in range(ntimes) if i not in done]
+    if batch is None:
+        groups = [[i] for i in todo]
+    else:
+        groups = [todo[i:i + chunksize] for i in range(0, len(todo), chunksize)]
+    run = partial(run_group, realisation, batch)
+    tasks = [[seeds[i] for i in group] for group in groups]
+    sizes = {}
+
+    def collect(results):
+        for group, result in zip(groups, tqdm(results, total=len(groups))):
+            for i, curve in zip(group, result):
+                if store is not None:
+                    store.append(i, curve)
+                else:
+                    sizes[i] = curve
+
+    if n_workers == 1:
+        collect(run(task) for task in tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                                 initargs=(instrumentation.config(),)) as executor:
+            collect(executor.map(run, tasks, chunksize=chunksize if batch is None else 1))
+
+    if store is not None:
+        return store.load(range(ntimes))
+    return np.array([sizes[i] for i in range(ntimes)])
+
+
+def mean_std(sizes):
+    """
+    Mean and standard deviation over realisations, in the format of `save_output`
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    return list(np.mean(sizes, axis=0)), list(np.std(sizes, axis=0))
@@ -0,0 +1,188 @@
+"""
+Newman-Ziff algorithm: sizes of the largest cluster for every number of removed nodes (or edges)
+from a single pass over one removal order. Elements are added back in reverse order and joined
+with a union-find structure, so the whole N*/N curve costs O(N + E) per realisation.
+
+M. E. J. Newman and R. M. Ziff, Phys. Rev. Lett. 85, 4104 (2000).
+"""
+import numpy as np
+import sys
+
+sys.path.append('..')
+from scripts.strategies import strategy_order
+from scripts.instrumentation import timed
+
+
+def edges_to_csr(edges, N: int):
+    """
+    Build CSR adjacency of an undirected graph
+
+    :param edges: array of shape (E, 2)
+    :param N: number of nodes
+    :return: (indptr, indices)
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    src = np.concatenate([edges[:, 0], edges[:, 1]])
+    dst = np.concatenate([edges[:, 1], edges[:, 0]])
+    indices = dst[np.argsort(src, kind='stable')]
+    indptr = np.zeros(N + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=N), out=indptr[1:])
+    return indptr, indices
+
+
+def find(parent, x):
+    root = x
+    while parent[root] != root:
+        root = parent[root]
+    # Path compression
+    while parent[x] != root:
+        parent[x], x = root, parent[x]
+    return root
+
+
+def union(parent, size, a, b):
+    """
+    Join clusters of `a` and `b` (union by size)
+
+    :return: size of the joined cluster
+    """
+    a = find(parent, a)
+    b = find(parent, b)
+    if a == b:
+        return size[a]
+    if size[a] < size[b]:
+        a, b = b, a
+    parent[b] = a
+    size[a] += size[b]
+    return size[a]
+
+
+def largest_cluster_node_removal(indptr, indices, order):
+    """
+    Size of the largest cluster after removing the first k nodes of `order`, for every k.
+    Nodes which are not in `order` are never removed.
+
+    :param indptr: CSR index pointer (see `edges_to_csr`)
+    :param indices: CSR neighbours
+    :param order: removal order of nodes
+    :return: array of length len(order) + 1
+    """
+    N = len(indptr) - 1
+    order = np.asarray(order, dtype=np.int64)
+    active = np.ones(N, dtype=bool)
+    active[order] = False
+    fixed = np.flatnonzero(active).tolist()
+
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    active = active.tolist()
+    parent = list(range(N))
+    size = [1] * N
+
+    largest = 1 if fixed else 0
+    for v in fixed:
+        for u in indices[indptr[v]:indptr[v + 1]]:
+            if active[u]:
+                largest = max(largest, union(parent, size, u, v))
+
+    curve = np.empty(len(order) + 1, dtype=np.int64)
+    curve[len(order)] = largest
+    for k in range(len(order) - 1, -1, -1):
+        v = int(order[k])
+        active[v] = True
+        largest = max(largest, 1)
+        for u in indices[indptr[v]:indptr[v + 1]]:
+            if active[u]:
+                largest = max(largest, union(parent, size, u, v))
+        curve[k] = largest
+    return curve
+
+
+def largest_cluster_edge_removal(edges, N: int, order):
+    """
+    Size of the largest cluster after removing the first k edges of `order`, for every k.
+    Edges which are not in `order` are never removed.
+
+    :param edges: array of shape (E, 2)
+    :param N: number of nodes
+    :param order: removal order of edges (indices into `edges`)
+    :return: array of length len(order) + 1
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    order = np.asarray(order, dtype=np.int64)
+    fixed = np.ones(len(edges), dtype=bool)
+    fixed[order] = False
+
+    parent = list(range(N))
+    size = [1] * N
+
+    largest = 1 if N > 0 else 0
+    for u, v in edges[fixed].tolist():
+        largest = max(largest, union(parent, size, u, v))
+
+    curve = np.empty(len(order) + 1, dtype=np.int64)
+    curve[len(order)] = largest
+    sources = edges[order, 0].tolist()
+    targets = edges[order, 1].tolist()
+    for k in range(len(order) - 1, -1, -1):
+        largest = max(largest, union(parent, size, sources[k], targets[k]))
+        curve[k] = largest
+    return curve
+
+
+def number_removed(n: int, ps):
+    """
+    Number of removed elements for each fraction in `ps`, rounded down as in int(n * p)
+    """
+    return (n * np.asarray(ps, dtype=float)).astype(np.int64)
+
+
+@timed()
+def rescaled_gcc_curve(edges, N: int, ps, random_attack=True, type='node', stable_edges=None, adaptive=False,
+                       strategy='degree', csr=None, **strategy_kwargs):
+    """
+    N*/N at every p of `ps` for one realisation of an attack, with the same rescaling as
+    the `get_rescaled_gcc_size_after_*` functions in `random_attacks.py`
+
+    :param edges: array of shape (E, 2)
+    :param N: number of nodes
+    :param ps: fractions of removed nodes or edges
+    :param random_attack: random removal of nodes/edges or removal of the nodes ranked by `strategy`
+    :param type: 'node' or 'edge' (random attack only)
+    :param stable_edges: boolean mask of edges which cannot be removed (modified HRG), in the
+        intentional attack their end nodes are not removed either
+    :param adaptive: intentional attack recalculates degrees after each removed node
+    :param strategy: ranking of nodes of the intentional attack (see `strategies.strategy_order`)
+    :param csr: (indptr, indices) of the graph if already built (e.g. of a CSRGraph), else built from `edges`
+    :param strategy_kwargs: arguments of the strategy (`bridge_edges` of 'bridge')
+    :return: np.array of len(ps)
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if csr is None and (not random_attack or type == 'node'):
+        csr = edges_to_csr(edges, N)
+    if not random_attack:
+        candidates = np.arange(N)
+        if stable_edges is not None:
+            stable_nodes = np.zeros(N, dtype=bool)
+            stable_nodes[edges[stable_edges].ravel()] = True
+            candidates = np.flatnonzero(~stable_nodes)
+        indptr, indices = csr
+        order = strategy_order(strategy, indptr, indices, candidates, adaptive, **strategy_kwargs)
+        curve = largest_cluster_node_removal(indptr, indices, order)
+        removed = np.minimum(number_removed(N, ps), len(order))
+        remaining = N - removed
+        remaining[remaining == 0] = 1
+        return curve[removed] / remaining
+
+    if type == 'node':
+        order = np.random.permutation(N)
+        curve = largest_cluster_node_removal(*csr, order)
+    elif type == 'edge':
+        removable = np.arange(len(edges))
+        if stable_edges is not None:
+            removable = np.flatnonzero(~np.asarray(stable_edges, dtype=bool))
+        order = np.random.permutation(removable)
+        curve = largest_cluster_edge_removal(edges, N, order)
+    else:
+        raise ValueError(f'Unknown attack type: {type}')
+    return curve[number_removed(len(order), ps)] / max(N, 1)
@@ -1,175 +1,632 @@
-from graph_tool.all import *
 import numpy as np
 import sys
-from tqdm import tqdm
+from functools import partial
 import pandas as pd
 
+try:
+    from graph_tool.all import *
+    HAS_GRAPH_TOOL = True
+except ImportError:
+    # Only the NumPy backends are available
+    HAS_GRAPH_TOOL = False
+
 sys.path.append('..')
-from scripts.hrg import load_dendrogram, generate_hrg
+from scripts.hrg import load_dendrogram, generate_hrg, generate_hrg_edges, hrg_communities, hrg2gt, total_size, \
+    avg_degree
+from scripts.convert_graphs import edges2gt
+from scripts.csr_graph import CSRGraph, index_dtype, stack_graphs, block_gcc_sizes
 from scripts.giant_connected_component import size_gcc
-from scripts.generate_network import erdos_renyi_v2, barabasi_albert
-
-
-def get_vertices(g):
-    return np.array(list(g.vertices()))
-
-
-def get_edges(g):
-    return np.array(list(g.edges()))
-
-
-def convert_edges_to_list(edges):
-    output_edges = []
-    for edge in edges:
-        source = int(str(edge.source()))
-        target = int(str(edge.target()))
-        output_edges.append((source, target))
-    return output_edges
-
-
-def simulate_attack_erdos_renyi(N, p_er, ps, random_attack=True, type='node', ntimes=1):
-    mean_sizes = []
-    std_sizes = []
-    for p in tqdm(ps):
-        sizes_per_p = []
-        for _ in range(ntimes):
-            g = erdos_renyi_v2(N, p_er)
-            if random_attack:
-                sizes_per_p.append(get_rescaled_gcc_size_after_random_attack(g, p, type=type))
-            else:
-                sizes_per_p.append(get_rescaled_gcc_size_after_intentional_attack(g, p))
-        mean_sizes.append(np.mean(sizes_per_p))
-        std_sizes.append(np.std(sizes_per_p))
-    return mean_sizes, std_sizes
-
-
-def simulate_attack_barabasi_albert(N, ps, m=3, random_attack=True, type='node', ntimes=1):
-    mean_sizes = []
-    std_sizes = []
-    for p in tqdm(ps):
-        sizes_per_p = []
-        for _ in range(ntimes):
-            g = barabasi_albert(N, m)
-            if random_attack:
-                sizes_per_p.append(get_rescaled_gcc_size_after_random_attack(g, p, type))
-            else:
-                sizes_per_p.append(get_rescaled_gcc_size_after_intentional_attack(g, p))
-        mean_sizes.append(np.mean(sizes_per_p))
-        std_sizes.append(np.std(sizes_per_p))
-    return mean_sizes, std_sizes
-
-
-def simulate_attack_hrg(dendrogram_path: str, ps, random_attack=True, type='node', ntimes=1):
-    mean_sizes = []
-    std_sizes = []
+from scripts.generate_network import erdos_renyi_v3, erdos_renyi_edges, barabasi_albert, barabasi_albert_edges
+from scripts.percolation import rescaled_gcc_curve, edges_to_csr
+from scripts.strategies import adaptive_degree_order, strategy_order
+from scripts.parallel import run_realisations, mean_std, seed_global_rngs, seeded_realisation
+from scripts.network_cache import file_hash
+import scripts.parallel as parallel
+import scripts.instrumentation as instrumentation
+
+
+def stable_edge_mask(g, edges_between_communities):
+    """
+    Boolean mask over `g.get_edges()` of the edges between communities, taken from the edge property
+    `stable` set by `generate_hrg` or else matched against `edges_between_communities` (in either direction)
+    """
+    if isinstance(g, CSRGraph):
+        return g.stable[g.edge_indices()]
+    if 'stable' in g.ep:
+        return g.get_edges([g.ep['stable']])[:, 2].astype(bool)
+    stable = set(map(tuple, edges_between_communities))
+    return np.array([(s, t) in stable or (t, s) in stable for s, t in g.get_edges().tolist()], dtype=bool)
+
+
+def stable_edge_index(g, edges_between_communities):
+    """
+    Boolean array over edge indices of `g` of the edges between communities
+    """
+    if isinstance(g, CSRGraph):
+        return g.stable
+    if 'stable' in g.ep:
+        return g.ep['stable'].a.astype(bool)
+    stable = np.zeros(g.edge_index_range, dtype=bool)
+    stable[g.get_edges([g.edge_index])[:, 2]] = stable_edge_mask(g, edges_between_communities)
+    return stable
+
+
+def get_rescaled_gcc_curve(g, ps, random_attack=True, type='node', stable_edges=None, adaptive=False,
+                           strategy='degree', **strategy_kwargs):
+    """
+    N*/N at every p of `ps` from a single attack on `g` (Newman-Ziff), `g` is not modified
+    """
+    return rescaled_gcc_curve(g.get_edges(), g.num_vertices(), ps, random_attack, type, stable_edges, adaptive,
+                              strategy, graph_csr(g), **strategy_kwargs)
+
+
+def graph_csr(g):
+    """
+    (indptr, indices) of `g`, the CSR arrays of a CSRGraph (not a view) are reused instead of rebuilt
+    """
+    if isinstance(g, CSRGraph) and g.vertex_mask is None and g.edge_mask is None:
+        return g.csr[:2]
+    return edges_to_csr(g.get_edges(), g.num_vertices())
+
+
+# Backends attacking CSRGraph
+CSR_BACKENDS = ('csr', 'batched')
+# Backends generating CSRGraph ('newman_ziff' only needs the edges)
+EDGE_BACKENDS = CSR_BACKENDS + ('newman_ziff',)
+BACKENDS = ('graph_tool',) + EDGE_BACKENDS
+
+
+def check_backend(backend):
+    """
+    Raise ValueError for an unknown backend and ImportError for 'graph_tool' if graph-tool is not installed
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend: {backend!r}, expected one of {BACKENDS}')
+    if backend == 'graph_tool' and not HAS_GRAPH_TOOL:
+        raise ImportError(f"backend='graph_tool' needs graph-tool, which is not installed (use one of {EDGE_BACKENDS})")
+
+
+def erdos_renyi_graph(N, p_er, backend='graph_tool'):
+    check_backend(backend)
+    if backend in EDGE_BACKENDS:
+        return CSRGraph(erdos_renyi_edges(N, p_er, dtype=index_dtype(N)), N)
+    return erdos_renyi_v3(N, p_er)
+
+
+def barabasi_albert_graph(N, m=3, backend='graph_tool'):
+    check_backend(backend)
+    if backend in EDGE_BACKENDS:
+        return CSRGraph(barabasi_albert_edges(N, m, dtype=index_dtype(N)), N)
+    return barabasi_albert(N, m)
+
+
+def hrg_graph(dendrogram, backend='graph_tool'):
+    check_backend(backend)
+    if backend in EDGE_BACKENDS:
+        N = total_size(dendrogram)
+        edges, between = generate_hrg_edges(dendrogram, dtype=index_dtype(N))
+        return CSRGraph(edges, N, stable=between, community=hrg_communities(dendrogram))
+    return generate_hrg(dendrogram)[0]
+
+
+def has_stable_edges(g):
+    if isinstance(g, CSRGraph):
+        return g.stable is not None
+    return 'stable' in g.ep
+
+
+def graph_to_arrays(g):
+    """
+    :return: (arrays, meta) of `g` for `EnsembleCache.store`
+    """
+    arrays = {'edges': g.get_edges().astype(np.int32)}
+    if has_stable_edges(g):
+        arrays['between'] = stable_edge_mask(g, None)
+    if isinstance(g, CSRGraph) and g.community is not None:
+        arrays['community'] = g.community
+    return arrays, {'N': g.num_vertices()}
+
+
+def arrays_to_graph(arrays, meta, backend='graph_tool'):
+    if backend in EDGE_BACKENDS:
+        return CSRGraph(arrays['edges'], meta['N'], stable=arrays.get('between'), community=arrays.get('community'))
+    if 'between' in arrays:
+        return hrg2gt(arrays['edges'], arrays['between'], meta['N'])
+    return edges2gt(arrays['edges'], meta['N'])
+
+
+def cached_generate(cache, generator: str, params: dict, generate, backend='graph_tool'):
+    """
+    Generate a graph or load it from `cache`. The key includes the seed of the running realisation
+    (see `parallel.run_realisations`), so runs with the same master seed share their graphs across
+    different attacks. Unseeded runs are not cached.
+
+    :param cache: EnsembleCache or None
+    :param generator: name of the generator
+    :param params: parameters of the generator
+    :param generate: function returning a new graph
+    :param backend: 'csr', 'batched' or 'newman_ziff' rebuild a CSRGraph, else a graph-tool graph (CSR graphs
+        are cached separately, their edge order differs)
+    """
+    seed_sequence = parallel.current_seed_sequence
+    if seed_sequence is None:
+        return generate()
+    if cache is None:
+        g = generate()
+    else:
+        key = cache.key(generator, dict(params, backend='csr') if backend in EDGE_BACKENDS else params, seed_sequence)
+        cached = cache.load(key)
+        if cached is None:
+            cached = graph_to_arrays(generate())
+            cache.store(key, *cached)
+        # Rebuilt from the arrays in both cases, so edge indices do not depend on a cache hit
+        g = arrays_to_graph(*cached, backend)
+    # Attacks draw the same random numbers whether the graph was generated, loaded or not cached at all
+    seed_global_rngs(np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (0,)))
+    return g
+
+
+def attack_realisation(generate, ps, random_attack=True, type='node', backend='graph_tool', modified_hrg=False,
+                       adaptive=False, strategy='degree', common_random_numbers=False):
+    """
+    N*/N at every p of `ps` for a single realisation of the attack
+
+    :param generate: function returning a new graph, or a tuple (graph, edges between communities)
+    :param backend: 'graph_tool' attacks the generated graph independently at each p (through vertex/edge
+        filters), 'csr' does the same on a CSRGraph without graph-tool, 'newman_ziff' computes the whole curve
+        of a CSRGraph from a single removal order ('batched' runs many realisations at once, see `attack_batch`)
+    :param adaptive: intentional attack recalculates degrees after each removed node
+    :param strategy: ranking of vertices of the intentional attack (see `strategies.STRATEGIES`)
+    :param common_random_numbers: random attack removes prefixes of one random order at all ps (as 'newman_ziff')
+        instead of independent samples at every p
+    :return: list of len(ps)
+    """
+    check_backend(backend)
+    with instrumentation.stage('generate'):
+        g = generate()
+    g, edges_between_communities = g if isinstance(g, tuple) else (g, None)
+    if backend == 'newman_ziff':
+        stable_edges = stable_edge_mask(g, edges_between_communities) if modified_hrg else None
+        return list(get_rescaled_gcc_curve(g, ps, random_attack, type, stable_edges, adaptive, strategy,
+                                           **strategy_arguments(g, edges_between_communities, strategy)))
+
+    # Attacks do not modify the graph, so it is generated once per realisation
+    with instrumentation.stage('ranking'):
+        ranking = attack_ranking(g, edges_between_communities, random_attack, modified_hrg, adaptive, strategy,
+                                 type, common_random_numbers)
+    sizes = []
+    for p in ps:
+        with instrumentation.stage('attack'):
+            u, N = attack_view(g, edges_between_communities, p, random_attack, type, modified_hrg, ranking)
+        count_removed(g, u)
+        sizes.append(size_gcc(u) / N)
+    return sizes
+
+
+def count_removed(g, u):
+    """
+    Count the vertices and edges removed from `g` in the attacked view `u` (if instrumentation is enabled)
+    """
+    if instrumentation.enabled():
+        instrumentation.count('vertices_removed', g.num_vertices() - u.num_vertices())
+        instrumentation.count('edges_removed', g.num_edges() - u.num_edges())
+
+
+def attack_batch(generate, ps, random_attack, type, modified_hrg, adaptive, strategy, common_random_numbers,
+                 seed_sequences):
+    """
+    N*/N at every p of `ps` for a batch of realisations on CSR graphs. The attacked graphs of all
+    realisations are stacked into one block graph, so connected components are computed once per p
+    for the whole batch. Every realisation draws the same random numbers as in `attack_realisation`
+    with backend='csr', so the results are the same. Masks of all attacked views are kept, about
+    len(seed_sequences) * len(ps) * (N + E) bytes.
+
+    :param seed_sequences: seed sequences of the realisations (see `parallel.run_realisations`)
+    :return: np.array of shape (len(seed_sequences), len(ps))
+    """
+    graphs = []
+    vertex_masks = []
+    edge_masks = []
+    N = []
+    for seed_sequence in seed_sequences:
+        with seeded_realisation(seed_sequence):
+            with instrumentation.stage('generate'):
+                g = generate()
+            g, edges_between_communities = g if isinstance(g, tuple) else (g, None)
+            with instrumentation.stage('ranking'):
+                ranking = attack_ranking(g, edges_between_communities, random_attack, modified_hrg, adaptive,
+                                         strategy, type, common_random_numbers)
+            with instrumentation.stage('attack'):
+                vertex_mask, edge_mask, n = attack_masks(g, edges_between_communities, ps, random_attack, type,
+                                                         modified_hrg, ranking)
+        graphs.append(g)
+        vertex_masks.append(vertex_mask)
+        edge_masks.append(edge_mask)
+        N.append(n)
+    stacked, block = stack_graphs(graphs)
+    # Row j holds the masks of the stacked graph at ps[j]
+    vertex_masks = np.concatenate(vertex_masks, axis=1) if vertex_masks[0] is not None else None
+    edge_masks = np.concatenate(edge_masks, axis=1) if edge_masks[0] is not None else None
+    N = np.array(N)
+
+    sizes = np.empty((len(graphs), len(ps)))
+    for j in range(len(ps)):
+        view = stacked._view(None if vertex_masks is None else vertex_masks[j],
+                             None if edge_masks is None else edge_masks[j])
+        count_removed(stacked, view)
+        sizes[:, j] = block_gcc_sizes(view, block, len(graphs)) / N[:, j]
+    return sizes
+
+
+def attack_realisations(generate, ps, random_attack, type, backend, modified_hrg=False, adaptive=False,
+                        strategy='degree', common_random_numbers=False):
+    """
+    :return: (realisation, batch) for `simulate_attack`, batch is None unless backend is 'batched'
+    """
+    check_backend(backend)
+    realisation = partial(attack_realisation, generate, ps, random_attack, type, backend, modified_hrg, adaptive,
+                          strategy, common_random_numbers)
+    batch = None
+    if backend == 'batched':
+        batch = partial(attack_batch, generate, ps, random_attack, type, modified_hrg, adaptive, strategy,
+                        common_random_numbers)
+    return realisation, batch
+
+
+def simulate_attack(realisation, ntimes=1, n_workers=1, seed=None, chunksize=1, store=None, meta=None,
+                    return_sizes=False, batch=None):
+    """
+    Average `ntimes` realisations of an attack. The simulate_attack_* functions below build the
+    realisation; their `cache` (EnsembleCache) reuses generated graphs of seeded runs.
+
+    :param realisation: picklable function without arguments returning N*/N for every p
+    :param n_workers: number of processes (None uses all cores)
+    :param seed: master seed, results for a given seed do not depend on `n_workers`
+    :param chunksize: number of realisations sent to a worker at once (stacked into one graph by `batch`)
+    :param store: ResultsStore receiving the curve of every realisation, an interrupted sweep
+        resumes from it
+    :param meta: metadata of the sweep saved in `store` (model, attack, N, <k>, ps)
+    :param return_sizes: return N*/N of every realisation, array of shape (ntimes, len(ps))
+    :param batch: function running many realisations at once (backend='batched'), used instead of `realisation`
+    :return: mean_sizes, std_sizes
+    """
+    if store is not None:
+        store.update_meta(**(meta or {}))
+    sizes = run_realisations(realisation, ntimes, seed, n_workers, chunksize, store, batch)
+    return sizes if return_sizes else mean_std(sizes)
+
+
+def attack_meta(model: str, N, k, ps, random_attack, type, adaptive, backend, strategy='degree',
+                common_random_numbers=False, **meta):
+    return dict(meta, model=model, N=N, k=k, ps=list(map(float, ps)), random_attack=random_attack,
+                type=type if random_attack else None, adaptive=adaptive and not random_attack, backend=backend,
+                strategy=None if random_attack else getattr(strategy, '__name__', str(strategy)),
+                common_random_numbers=common_random_numbers and random_attack)
+
+
+def simulate_attack_erdos_renyi(N, p_er, ps, random_attack=True, type='node', ntimes=1, backend='graph_tool',
+                                n_workers=1, seed=None, chunksize=1, adaptive=False, cache=None, store=None,
+                                return_sizes=False, strategy='degree', common_random_numbers=False):
+    generate = partial(cached_generate, cache, 'erdos_renyi_v3', {'N': N, 'p': p_er},
+                       partial(erdos_renyi_graph, N, p_er, backend), backend)
+    realisation, batch = attack_realisations(generate, ps, random_attack, type, backend, adaptive=adaptive,
+                                             strategy=strategy, common_random_numbers=common_random_numbers)
+    meta = attack_meta('ER', N, p_er * (N - 1), ps, random_attack, type, adaptive, backend, strategy,
+                       common_random_numbers)
+    return simulate_attack(realisation, ntimes, n_workers, seed, chunksize, store, meta, return_sizes, batch)
+
+
+def simulate_attack_barabasi_albert(N, ps, m=3, random_attack=True, type='node', ntimes=1, backend='graph_tool',
+                                    n_workers=1, seed=None, chunksize=1, adaptive=False, cache=None, store=None,
+                                    return_sizes=False, strategy='degree', common_random_numbers=False):
+    generate = partial(cached_generate, cache, 'barabasi_albert', {'N': N, 'm': m},
+                       partial(barabasi_albert_graph, N, m, backend), backend)
+    realisation, batch = attack_realisations(generate, ps, random_attack, type, backend, adaptive=adaptive,
+                                             strategy=strategy, common_random_numbers=common_random_numbers)
+    meta = attack_meta('BA', N, 2 * m, ps, random_attack, type, adaptive, backend, strategy,
+                       common_random_numbers)
+    return simulate_attack(realisation, ntimes, n_workers, seed, chunksize, store, meta, return_sizes, batch)
+
+
+def simulate_attack_hrg(dendrogram_path: str, ps, random_attack=True, type='node', ntimes=1, backend='graph_tool',
+                        n_workers=1, seed=None, chunksize=1, adaptive=False, cache=None, store=None,
+                        return_sizes=False, strategy='degree', common_random_numbers=False):
     dendrogram = load_dendrogram(dendrogram_path)
-    for p in tqdm(ps):
-        sizes_per_p = []
-        for _ in range(ntimes):
-            g, _ = generate_hrg(dendrogram)
-            if random_attack:
-                sizes_per_p.append(get_rescaled_gcc_size_after_random_attack(g, p, type))
-            else:
-                sizes_per_p.append(get_rescaled_gcc_size_after_intentional_attack(g, p))
-        mean_sizes.append(np.mean(sizes_per_p))
-        std_sizes.append(np.std(sizes_per_p))
-    return mean_sizes, std_sizes
-
-
-def simulate_attack_hrg_modification(dendrogram_path: str, ps, random_attack=True, ntimes=1):
-    mean_sizes = []
-    std_sizes = []
+    generate = partial(cached_generate, cache, 'hrg', {'dendrogram': file_hash(dendrogram_path)},
+                       partial(hrg_graph, dendrogram, backend), backend)
+    realisation, batch = attack_realisations(generate, ps, random_attack, type, backend, adaptive=adaptive,
+                                             strategy=strategy, common_random_numbers=common_random_numbers)
+    meta = attack_meta('HRG', total_size(dendrogram), avg_degree(dendrogram), ps, random_attack, type, adaptive,
+                       backend, strategy, common_random_numbers, dendrogram=dendrogram_path)
+    return simulate_attack(realisation, ntimes, n_workers, seed, chunksize, store, meta, return_sizes, batch)
+
+
+def simulate_attack_hrg_modification(dendrogram_path: str, ps, random_attack=True, ntimes=1, backend='graph_tool',
+                                     n_workers=1, seed=None, chunksize=1, adaptive=False, cache=None, store=None,
+                                     return_sizes=False, strategy='degree', common_random_numbers=False):
     dendrogram = load_dendrogram(dendrogram_path)
-    for p in tqdm(ps):
-        sizes_per_p = []
-        for _ in range(ntimes):
-            g, edges_between_communities = generate_hrg(dendrogram)
-            if random_attack:
-                sizes_per_p.append(
-                    get_rescaled_gcc_size_after_random_attack_edge_modified_hrg(g, edges_between_communities, p))
-            else:
-                sizes_per_p.append(
-                    get_rescaled_gcc_size_after_intentional_attack_modified_hrg(g, edges_between_communities, p))
-        mean_sizes.append(np.mean(sizes_per_p))
-        std_sizes.append(np.std(sizes_per_p))
-    return mean_sizes, std_sizes
-
-
-def get_rescaled_gcc_size_after_random_attack_edge_modified_hrg(g, edges_between_communities, p):
-    all_edges = get_edges(g)
-
+    # Edges between communities are marked by the `stable` property of the graph
+    generate = partial(cached_generate, cache, 'hrg', {'dendrogram': file_hash(dendrogram_path)},
+                       partial(hrg_graph, dendrogram, backend), backend)
+    realisation, batch = attack_realisations(generate, ps, random_attack, 'edge', backend, modified_hrg=True,
+                                             adaptive=adaptive, strategy=strategy,
+                                             common_random_numbers=common_random_numbers)
+    meta = attack_meta('HRG (stable)', total_size(dendrogram), avg_degree(dendrogram), ps, random_attack, 'edge',
+                       adaptive, backend, strategy, common_random_numbers, dendrogram=dendrogram_path)
+    return simulate_attack(realisation, ntimes, n_workers, seed, chunksize, store, meta, return_sizes, batch)
+
+
+def remove_vertices_view(g, vertices):
+    """
+    View of `g` without the given vertices, `g` is not modified
+
+    :param vertices: vertex indices
+    """
+    if isinstance(g, CSRGraph):
+        return g.remove_vertices(vertices)
+    vfilt = g.new_vertex_property('bool', val=True)
+    vfilt.a[vertices] = False
+    return GraphView(g, vfilt=vfilt)
+
+
+def remove_edges_view(g, edges):
+    """
+    View of `g` without the given edges, `g` is not modified
+
+    :param edges: edge indices
+    """
+    if isinstance(g, CSRGraph):
+        return g.remove_edges(edges)
+    efilt = g.new_edge_property('bool', val=True)
+    efilt.a[edges] = False
+    return GraphView(g, efilt=efilt)
+
+
+def get_edge_indices(g):
+    if isinstance(g, CSRGraph):
+        return g.edge_indices()
+    return g.get_edges([g.edge_index])[:, 2]
+
+
+def attack_ranking(g, edges_between_communities, random_attack, modified_hrg=False, adaptive=False,
+                   strategy='degree', type='node', common_random_numbers=False):
+    """
+    Ranking of vertices of the intentional attack, shared by all ps. For random attacks a random order
+    of the removable vertices/edges if `common_random_numbers`, else None (independent samples at every p).
+    """
+    if random_attack:
+        if not common_random_numbers:
+            return None
+        if modified_hrg:
+            index = get_edge_indices(g)
+            return np.random.permutation(index[~stable_edge_index(g, edges_between_communities)[index]])
+        if type == 'node':
+            return np.random.permutation(g.get_vertices())
+        elif type == 'edge':
+            return np.random.permutation(get_edge_indices(g))
+        raise ValueError(f'Unknown attack type: {type}')
+    exclude = stable_vertex_mask(g, edges_between_communities) if modified_hrg else None
+    return rank_vertices(g, exclude, adaptive, strategy, edges_between_communities)
+
+
+def attack_view(g, edges_between_communities, p, random_attack=True, type='node', modified_hrg=False, ranking=None):
+    """
+    Attacked view of `g` for a fraction p with the arguments of `attack_realisation`
+
+    :return: (view, N) - N*/N is size_gcc(view) / N
+    """
+    if modified_hrg:
+        if random_attack:
+            return random_attack_edge_modified_hrg_view(g, edges_between_communities, p, ranking)
+        return intentional_attack_modified_hrg_view(g, edges_between_communities, p, ranking=ranking)
+    if random_attack:
+        if type == 'node':
+            return random_attack_node_view(g, p, ranking)
+        elif type == 'edge':
+            return random_attack_edge_view(g, p, ranking)
+        raise ValueError(f'Unknown attack type: {type}')
+    return intentional_attack_view(g, p, ranking=ranking)
+
+
+def removal_masks(n: int, candidates, counts, ranking=None):
+    """
+    Boolean masks of shape (len(counts), n), row j keeps all but counts[j] of the candidates: a prefix of
+    `ranking`, or a sample of np.random.choice for every row (the draws of the `*_view` functions)
+    """
+    if ranking is not None:
+        position = np.full(n, n)
+        position[ranking] = np.arange(len(ranking))
+        return position[None, :] >= counts[:, None]
+    keep = np.ones((len(counts), n), dtype=bool)
+    for row, k in zip(keep, counts):
+        row[np.random.choice(candidates, k, replace=False)] = False
+    return keep
+
+
+def attack_masks(g, edges_between_communities, ps, random_attack=True, type='node', modified_hrg=False,
+                 ranking=None):
+    """
+    Masks of the views of `attack_view` for all ps at once, `g` is a CSRGraph
+
+    :return: (vertex masks of shape (len(ps), N) or None, edge masks of shape (len(ps), E) or None,
+        array of N of every p)
+    """
+    ps = np.asarray(ps, dtype=float)
+    n = max(g.num_vertices(), 1)
+    if modified_hrg and random_attack:
+        index = get_edge_indices(g)
+        removable = index[~stable_edge_index(g, edges_between_communities)[index]]
+        keep = removal_masks(len(g.edges), removable, (len(removable) * ps).astype(np.int64), ranking)
+        return None, keep, np.full(len(ps), n)
+    if random_attack and type == 'edge':
+        index = get_edge_indices(g)
+        keep = removal_masks(len(g.edges), index, (len(index) * ps).astype(np.int64), ranking)
+        return None, keep, np.full(len(ps), n)
+    if random_attack and type != 'node':
+        raise ValueError(f'Unknown attack type: {type}')
+    keep = removal_masks(g.N, g.get_vertices(), (g.num_vertices() * ps).astype(np.int64), ranking)
+    if random_attack:
+        return keep, None, np.full(len(ps), g.num_vertices())
+    return keep, None, np.maximum(keep.sum(axis=1), 1)
+
+
+def random_attack_edge_modified_hrg_view(g, edges_between_communities, p, ranking=None):
+    """
+    :param ranking: random order of the removable edges (see `attack_ranking`), its prefix is removed
+    """
+    if ranking is not None:
+        return remove_edges_view(g, ranking[:int(len(ranking) * p)]), max(g.num_vertices(), 1)
     # Do not remove links between cities!
-    converted_edges = convert_edges_to_list(all_edges)
-    idx_list = list(
-        map(lambda item: converted_edges.index(item) if item in converted_edges else None, edges_between_communities))
-    all_edges = np.delete(all_edges, idx_list)
+    index = get_edge_indices(g)
+    removable = index[~stable_edge_index(g, edges_between_communities)[index]]
 
-    edges = np.random.choice(all_edges, int(len(all_edges) * p), replace=False)
-    [g.remove_edge(e) for e in edges]
+    edges = np.random.choice(removable, int(len(removable) * p), replace=False)
     N = g.num_vertices() if g.num_vertices() != 0 else 1
-    return size_gcc(g) / N
-
-
-def get_rescaled_gcc_size_after_random_attack(g, p, type='node'):
-    if type == 'node':
-        return get_rescaled_gcc_size_after_random_attack_node(g, p)
-    elif type == 'edge':
-        return get_rescaled_gcc_size_after_random_attack_edge(g, p)
+    return remove_edges_view(g, edges), N
 
 
-def get_rescaled_gcc_size_after_random_attack_node(g, p):
-    all_vertices = get_vertices(g)
+def random_attack_node_view(g, p, ranking=None):
+    all_vertices = g.get_vertices()
+    if ranking is not None:
+        return remove_vertices_view(g, ranking[:int(g.num_vertices() * p)]), len(all_vertices)
     vertices = np.random.choice(all_vertices, int(g.num_vertices() * p), replace=False)
-    # [g.clear_vertex(v) for v in vertices]
-    g.remove_vertex(vertices)
-    return size_gcc(g) / len(all_vertices)
+    return remove_vertices_view(g, vertices), len(all_vertices)
 
 
-def get_rescaled_gcc_size_after_random_attack_edge(g, p):
-    all_edges = get_edges(g)
+def random_attack_edge_view(g, p, ranking=None):
+    all_edges = get_edge_indices(g)
+    if ranking is not None:
+        return remove_edges_view(g, ranking[:int(len(all_edges) * p)]), max(g.num_vertices(), 1)
     edges = np.random.choice(all_edges, int(len(all_edges) * p), replace=False)
-    # set_fast_edge_removal()
-    [g.remove_edge(e) for e in edges]
     N = g.num_vertices() if g.num_vertices() != 0 else 1
-    return size_gcc(g) / N
+    return remove_edges_view(g, edges), N
 
 
-def get_rescaled_gcc_size_after_intentional_attack(g, p):
-    vertices = get_vertices_highest_degree(g, p)
-    g.remove_vertex(vertices)
-    N = g.num_vertices() if g.num_vertices() != 0 else 1
-    return size_gcc(g) / N
+def intentional_attack_view(g, p, adaptive=False, ranking=None):
+    vertices = get_vertices_highest_degree(g, p, adaptive, ranking)
+    u = remove_vertices_view(g, vertices)
+    return u, u.num_vertices() if u.num_vertices() != 0 else 1
 
 
-def get_rescaled_gcc_size_after_intentional_attack_modified_hrg(g, edges_between_communities, p):
-    vertices = get_vertices_highest_degree_modified_hrg(g, edges_between_communities, p)
-    g.remove_vertex(vertices)
-    N = g.num_vertices() if g.num_vertices() != 0 else 1
-    return size_gcc(g) / N
+def intentional_attack_modified_hrg_view(g, edges_between_communities, p, adaptive=False, ranking=None):
+    vertices = get_vertices_highest_degree_modified_hrg(g, edges_between_communities, p, adaptive, ranking)
+    u = remove_vertices_view(g, vertices)
+    return u, u.num_vertices() if u.num_vertices() != 0 else 1
 
 
-def get_vertices_highest_degree_modified_hrg(g, edges_between_communities, p):
-    deg_vert = []
-    for d, v in zip(g.degree_property_map("total").a, g.get_vertices()):
-        deg_vert.append((d, v))
-    sorted_nodes = sorted(deg_vert, key=lambda x: x[0], reverse=True)
-    sorted_nodes = list(map(lambda x: x[1], sorted_nodes))
-    # Do not remove nodes which create stable links
-    stable_nodes = list(sum(edges_between_communities, ()))
-    sorted_nodes = [x for x in sorted_nodes if x not in stable_nodes]
-    return sorted_nodes[:int((g.num_vertices() * p))]
+def get_rescaled_gcc_size_after_random_attack_edge_modified_hrg(g, edges_between_communities, p):
+    u, N = random_attack_edge_modified_hrg_view(g, edges_between_communities, p)
+    return size_gcc(u) / N
 
 
-def get_vertices_highest_degree(g, p):
-    deg_vert = []
-    for d, v in zip(g.degree_property_map("total").a, g.get_vertices()):
-        deg_vert.append((d, v))
-    sorted_nodes = sorted(deg_vert, key=lambda x: x[0], reverse=True)
-    sorted_nodes = list(map(lambda x: x[1], sorted_nodes))
-    return sorted_nodes[:int((g.num_vertices() * p))]
+def get_rescaled_gcc_size_after_random_attack(g, p, type='node'):
+    if type == 'node':
+        return get_rescaled_gcc_size_after_random_attack_node(g, p)
+    elif type == 'edge':
+        return get_rescaled_gcc_size_after_random_attack_edge(g, p)
+
+
+def get_rescaled_gcc_size_after_random_attack_node(g, p):
+    u, N = random_attack_node_view(g, p)
+    return size_gcc(u) / N
 
 
-def save_output(mean_sizes, std_sizes, path: str):
+def get_rescaled_gcc_size_after_random_attack_edge(g, p):
+    u, N = random_attack_edge_view(g, p)
+    return size_gcc(u) / N
+
+
+def get_rescaled_gcc_size_after_intentional_attack(g, p, adaptive=False, ranking=None):
+    u, N = intentional_attack_view(g, p, adaptive, ranking)
+    return size_gcc(u) / N
+
+
+def get_rescaled_gcc_size_after_intentional_attack_modified_hrg(g, edges_between_communities, p, adaptive=False,
+                                                                ranking=None):
+    u, N = intentional_attack_modified_hrg_view(g, edges_between_communities, p, adaptive, ranking)
+    return size_gcc(u) / N
+
+
+def stable_vertex_mask(g, edges_between_communities):
+    """
+    Boolean array over vertices of `g` which have at least one link between communities
+    """
+    if isinstance(g, CSRGraph):
+        return g.stable_vertices()
+    if 'stable' in g.vp:
+        return g.vp['stable'].a.astype(bool)
+    stable = np.zeros(g.num_vertices(), dtype=bool)
+    stable[g.get_edges()[stable_edge_mask(g, edges_between_communities)].ravel()] = True
+    return stable
+
+
+def rank_vertices_highest_degree(g, exclude=None, adaptive=False):
+    """
+    Vertices in the order of the intentional attack (highest degree first). The ranking does not
+    depend on p, so it is computed once per graph: the attack removes its first int(N * p) vertices.
+
+    :param exclude: boolean mask of vertices which cannot be removed
+    :param adaptive: recalculate degrees after each removed vertex
+    :return: np.array of vertex indices
+    """
+    candidates = g.get_vertices() if exclude is None else np.flatnonzero(~exclude)
+    if adaptive:
+        indptr, indices = graph_csr(g)
+        return adaptive_degree_order(indptr, indices, candidates)
+    degree = g.degree() if isinstance(g, CSRGraph) else g.degree_property_map("total").a
+    return candidates[np.argsort(-degree[candidates], kind='stable')]
+
+
+def strategy_arguments(g, edges_between_communities, strategy):
+    """
+    Arguments of `strategies.strategy_order` taken from the graph: links between communities of 'bridge'
+    """
+    if strategy != 'bridge':
+        return {}
+    if edges_between_communities is None and not has_stable_edges(g):
+        raise ValueError('Bridge targeting needs a graph with communities (HRG)')
+    return {'bridge_edges': g.get_edges()[stable_edge_mask(g, edges_between_communities)]}
+
+
+def rank_vertices(g, exclude=None, adaptive=False, strategy='degree', edges_between_communities=None):
+    """
+    Vertices in the order of the intentional attack with the given strategy, computed once per graph
+
+    :param exclude: boolean mask of vertices which cannot be removed
+    :param adaptive: recalculate scores of the remaining graph during the attack
+    :param strategy: name from `strategies.STRATEGIES` or a function (see `strategies.strategy_order`)
+    :return: np.array of vertex indices
+    """
+    if strategy == 'degree':
+        return rank_vertices_highest_degree(g, exclude, adaptive)
+    candidates = g.get_vertices() if exclude is None else np.flatnonzero(~exclude)
+    indptr, indices = graph_csr(g)
+    return strategy_order(strategy, indptr, indices, candidates, adaptive,
+                          **strategy_arguments(g, edges_between_communities, strategy))
+
+
+def get_vertices_highest_degree_modified_hrg(g, edges_between_communities, p, adaptive=False, ranking=None):
+    if ranking is None:
+        # Do not remove nodes which create stable links
+        ranking = rank_vertices_highest_degree(g, stable_vertex_mask(g, edges_between_communities), adaptive)
+    return ranking[:int((g.num_vertices() * p))]
+
+
+def get_vertices_highest_degree(g, p, adaptive=False, ranking=None):
+    if ranking is None:
+        ranking = rank_vertices_highest_degree(g, adaptive=adaptive)
+    return ranking[:int((g.num_vertices() * p))]
+
+
+def save_output(mean_sizes, std_sizes, path: str, stderr=None, counts=None):
+    """
+    :param stderr: standard errors of the means (saved as column 'stderr' if given)
+    :param counts: numbers of realisations at every p (saved as column 'n' if given)
+    """
     df = pd.DataFrame(data=zip(mean_sizes, std_sizes))
     df.columns = ['mean', 'std']
+    if stderr is not None:
+        df['stderr'] = stderr
+    if counts is not None:
+        df['n'] = counts
     df.to_csv(path, index=False)
@@ -0,0 +1,71 @@
+"""
+Vectorized sampling of random edge arrays, without building any graph object.
+
+Functions accept `rng` (np.random.Generator); if None the global NumPy RNG is used,
+as in the rest of the scripts.
+"""
+import numpy as np
+
+
+def pair_index_to_edges(idx):
+    """
+    Map linear indices of node pairs (i, j), i > j, ordered as (1, 0), (2, 0), (2, 1), (3, 0), ...
+    to an array of edges of shape (len(idx), 2)
+    """
+    idx = np.asarray(idx, dtype=np.int64)
+    i = ((1 + np.sqrt(1 + 8 * idx.astype(float))) / 2).astype(np.int64)
+    # Correct rounding errors of the square root
+    i -= i * (i - 1) // 2 > idx
+    i += (i + 1) * i // 2 <= idx
+    j = idx - i * (i - 1) // 2
+    return np.column_stack([i, j])
+
+
+def geometric_skip_indices(total: int, p: float, rng=None):
+    """
+    Indices of successes among `total` Bernoulli(p) trials, sampled by geometric skipping
+    (Batagelj and Brandes 2005), in O(p * total) time and memory
+    """
+    rng = np.random if rng is None else rng
+    if p <= 0 or total <= 0:
+        return np.empty(0, dtype=np.int64)
+    if p >= 1:
+        return np.arange(total, dtype=np.int64)
+
+    expected = total * p
+    batch = int(expected + 5 * np.sqrt(expected) + 16)
+    chunks = []
+    last = -1
+    while last < total:
+        positions = last + np.cumsum(rng.geometric(p, size=batch).astype(np.int64))
+        chunks.append(positions)
+        last = positions[-1]
+        batch = max(16, batch // 4)
+    idx = np.concatenate(chunks)
+    return idx[idx < total]
+
+
+def gnp_edges(n: int, p: float, rng=None, dtype=np.int64):
+    """
+    Edges of the Erdos-Renyi graph G(n, p)
+
+    :param n: number of nodes
+    :param p: probability of an edge between each pair of nodes
+    :return: contiguous array of shape (E, 2)
+    """
+    idx = geometric_skip_indices(n * (n - 1) // 2, p, rng)
+    return np.ascontiguousarray(pair_index_to_edges(idx), dtype=dtype)
+
+
+def random_pairs_between(nodes1, nodes2, k: int, rng=None):
+    """
+    `k` edges between two sets of nodes, with both ends drawn uniformly with replacement,
+    duplicated edges are dropped
+
+    :return: array of shape (<= k, 2)
+    """
+    rng = np.random if rng is None else rng
+    if k <= 0 or len(nodes1) == 0 or len(nodes2) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.column_stack([rng.choice(nodes1, size=k), rng.choice(nodes2, size=k)]).astype(np.int64)
+    return np.unique(pairs, axis=0)
@@ -0,0 +1,132 @@
+"""
+Append-only store of the curves of single realisations of an attack sweep.
+
+A store is a directory with `meta.json` (model, attack, N, <k>, ps, master seed, ...) and one `.npy`
+file per completed realisation, written as soon as the realisation finishes. An interrupted sweep
+resumes from the stored realisations, and statistics are computed from the stored curves.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def seed_meta(seed) -> dict:
+    """
+    Entropy and spawn key of a master seed (int, sequence of ints or np.random.SeedSequence)
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    entropy = seed.entropy
+    return {'entropy': int(entropy) if np.ndim(entropy) == 0 else [int(e) for e in entropy],
+            'spawn_key': [int(k) for k in seed.spawn_key]}
+
+
+def seed_from_meta(meta: dict) -> np.random.SeedSequence:
+    """
+    np.random.SeedSequence stored by `seed_meta`
+    """
+    return np.random.SeedSequence(meta['entropy'], spawn_key=tuple(meta['spawn_key']))
+
+
+class ResultsStore:
+    def __init__(self, path: str):
+        """
+        :param path: directory of the store (created if it does not exist)
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def meta(self) -> dict:
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def update_meta(self, **meta):
+        """
+        Add metadata of the sweep. Values which are already stored cannot be changed, so that
+        realisations of different sweeps are not mixed.
+        """
+        stored = self.meta()
+        for key, value in meta.items():
+            value = json.loads(json.dumps(value, default=str))
+            if key in stored and stored[key] != value:
+                raise ValueError(f'Store {self.path} has {key}={stored[key]}, got {value}')
+            stored[key] = value
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(stored, f, indent=1)
+        os.replace(tmp, self.meta_path)
+
+    def master_seed(self, seed=None) -> np.random.SeedSequence:
+        """
+        Master seed of the sweep, stored as its entropy and spawn key. Without `seed` the stored one is
+        reused, or a new one is drawn for an empty store.
+
+        :param seed: int, sequence of ints or np.random.SeedSequence
+        """
+        if seed is None:
+            stored = self.meta().get('seed')
+            if stored is not None:
+                seed = seed_from_meta(stored)
+            elif self.completed():
+                raise ValueError(f'Store {self.path} has realisations but no seed, they cannot be resumed')
+            else:
+                seed = np.random.SeedSequence()
+        meta = seed_meta(seed)
+        self.update_meta(seed=meta)
+        return seed_from_meta(meta)
+
+    def completed(self):
+        """
+        :return: sorted indices of the stored realisations
+        """
+        return sorted(int(f[:-len('.npy')]) for f in os.listdir(self.path)
+                      if f.endswith('.npy') and f[:-len('.npy')].isdigit())
+
+    def append(self, index: int, sizes):
+        """
+        Store N*/N of the realisation `index` (atomically, a crash never leaves a partial file)
+        """
+        path = os.path.join(self.path, f'{index:06d}.npy')
+        tmp = os.path.join(self.path, f'.{index:06d}.tmp.npy')
+        np.save(tmp, np.asarray(sizes, dtype=float))
+        os.replace(tmp, path)
+
+    def load(self, indices=None):
+        """
+        :param indices: realisations to load (default all stored)
+        :return: np.array of shape (number of realisations, len(ps))
+        """
+        return np.array(list(self.iter_load(indices)))
+
+    def iter_load(self, indices=None):
+        """
+        Iterate over N*/N of the realisations, one file at a time (see `load`)
+        """
+        if indices is None:
+            indices = self.completed()
+        for index in indices:
+            yield np.load(os.path.join(self.path, f'{index:06d}.npy'))
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)) -> pd.DataFrame:
+        """
+        Mean, std and quantiles of N*/N at every p over the stored realisations
+        """
+        sizes = self.load()
+        df = pd.DataFrame({'mean': np.mean(sizes, axis=0), 'std': np.std(sizes, axis=0)})
+        for q in quantiles:
+            df[f'q{q:g}'] = np.quantile(sizes, q, axis=0)
+        return df
+
+    def save_output(self, path: str):
+        """
+        Save mean and std in the same format as `random_attacks.save_output`
+        """
+        self.summary(quantiles=())[['mean', 'std']].to_csv(path, index=False)
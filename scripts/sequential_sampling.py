@@ -0,0 +1,66 @@
+"""
+Precision-targeted sampling of N*/N curves with the simulate_attack_* functions.
+
+Instead of a fixed number of realisations at every p, realisations are added in rounds only at the
+ps whose standard error of the mean is still above the target (sequential stopping rule: stop at p
+once std / sqrt(n) <= target_se after at least `min_ntimes` realisations). Flat parts of the curve,
+where N*/N barely varies, stop after `min_ntimes`, while the realisations go to the transition.
+
+Every round uses common random numbers: each realisation attacks one graph with one random removal
+order for all ps (`common_random_numbers=True` of the simulate_attack_* functions), so the
+differences between neighbouring ps are not blurred by independent draws.
+"""
+import numpy as np
+
+
+def next_ntimes(counts, stds, target_se: float, min_ntimes: int, max_ntimes: int):
+    """
+    Number of realisations of the next round: enough for the least precise p by the current estimate
+    of its std, at most doubling the realisations so far (the estimate is noisy for small counts)
+    """
+    needed = np.ceil((stds / target_se) ** 2) - counts
+    ntimes = int(np.clip(needed.max(), min_ntimes, max(counts.max(), min_ntimes)))
+    return max(1, min(ntimes, int(max_ntimes - counts.max())))
+
+
+def simulate_to_precision(simulate, ps, target_se: float, min_ntimes=10, max_ntimes=1000, seed=None,
+                          common_random_numbers=True):
+    """
+    Simulate N*/N at every p until its standard error is at most `target_se`
+
+    :param simulate: simulate_attack_* function with fixed model arguments, called as
+        simulate(ps=ps, ntimes=ntimes, seed=seed, return_sizes=True, common_random_numbers=...), e.g.
+        partial(simulate_attack_erdos_renyi, N, p_er, backend='csr')
+    :param ps: fractions of removed nodes or edges
+    :param target_se: target standard error of the mean N*/N
+    :param min_ntimes: number of realisations of the first round (and minimum at every p)
+    :param max_ntimes: maximum number of realisations at every p, a p which reaches it stops even if the
+        target is not met (see the returned standard errors)
+    :param seed: master seed, every round gets its own child seed
+    :param common_random_numbers: one graph and one removal order per realisation for all ps
+    :return: mean_sizes, std_sizes, standard errors, numbers of realisations at every p
+    """
+    ps = np.asarray(ps, dtype=float)
+    sizes = [[] for _ in ps]
+    active = np.ones(len(ps), dtype=bool)
+    counts = np.zeros(len(ps), dtype=np.int64)
+    stds = np.zeros(len(ps))
+    seed_sequence = np.random.SeedSequence(seed) if seed is not None else None
+    ntimes = min_ntimes
+    while active.any():
+        seed_round = seed_sequence.spawn(1)[0].generate_state(4) if seed_sequence is not None else None
+        indices = np.flatnonzero(active)
+        result = np.asarray(simulate(ps=ps[indices], ntimes=ntimes, seed=seed_round, return_sizes=True,
+                                     common_random_numbers=common_random_numbers))
+        for column, i in enumerate(indices):
+            sizes[i].extend(result[:, column])
+            counts[i] = len(sizes[i])
+            stds[i] = np.std(sizes[i], ddof=1) if counts[i] > 1 else np.inf
+        stderr = stds / np.sqrt(np.maximum(counts, 1))
+        active &= (counts < min_ntimes) | (stderr > target_se)
+        active &= counts < max_ntimes
+        if active.any():
+            ntimes = next_ntimes(counts[active], stds[active], target_se, min_ntimes, max_ntimes)
+
+    return [float(np.mean(s)) for s in sizes], [float(np.std(s)) for s in sizes], [float(e) for e in stderr], \
+        [int(n) for n in counts]
@@ -0,0 +1,452 @@
+"""
+Removal orders of targeted attacks on graphs stored as CSR arrays (see `percolation.edges_to_csr`).
+
+Any prefix of an order returned here is the set of nodes removed by the attack, so the size of
+GCC for every fraction of removed nodes is given by `percolation.largest_cluster_node_removal`.
+
+Every strategy has a static order (scores of the initial graph) and an adaptive one. Degree and
+community-bridge scores are updated exactly after every removal in a bucket queue; betweenness,
+k-core, collective influence and PageRank are recomputed on the remaining graph after every
+`recompute` removed nodes (1 is fully adaptive).
+"""
+from functools import partial
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order
+
+
+class DegreeBucketQueue:
+    """
+    Priority queue of nodes keyed by degree: one doubly linked list of nodes per degree value,
+    `pop_max` and `decrement` take O(1) (amortised over all pops)
+    """
+
+    def __init__(self, degree, nodes):
+        max_degree = int(max(degree[nodes], default=0))
+        self.degree = [int(d) for d in degree]
+        self.head = [-1] * (max_degree + 1)
+        self.next = [-1] * len(degree)
+        self.prev = [-1] * len(degree)
+        self.queued = [False] * len(degree)
+        self.max_degree = max_degree
+        self.size = 0
+        # Reversed, so nodes with equal degree are popped in the vertex order
+        for v in reversed(list(nodes)):
+            self.push(int(v))
+
+    def push(self, v):
+        d = self.degree[v]
+        self.next[v] = self.head[d]
+        self.prev[v] = -1
+        if self.head[d] != -1:
+            self.prev[self.head[d]] = v
+        self.head[d] = v
+        self.queued[v] = True
+        self.size += 1
+
+    def unlink(self, v):
+        d = self.degree[v]
+        if self.prev[v] != -1:
+            self.next[self.prev[v]] = self.next[v]
+        else:
+            self.head[d] = self.next[v]
+        if self.next[v] != -1:
+            self.prev[self.next[v]] = self.prev[v]
+        self.queued[v] = False
+        self.size -= 1
+
+    def pop_max(self):
+        while self.head[self.max_degree] == -1:
+            self.max_degree -= 1
+        v = self.head[self.max_degree]
+        self.unlink(v)
+        return v
+
+    def decrement(self, v):
+        if self.queued[v]:
+            self.unlink(v)
+            self.degree[v] -= 1
+            self.push(v)
+        else:
+            self.degree[v] -= 1
+
+
+def static_degree_order(indptr, candidates=None):
+    """
+    Nodes ordered by their initial degree (descending), ties keep the vertex order
+
+    :param indptr: CSR index pointer
+    :param candidates: nodes which may be removed (default all)
+    """
+    degree = np.diff(indptr)
+    if candidates is None:
+        candidates = np.arange(len(degree))
+    return candidates[np.argsort(-degree[candidates], kind='stable')]
+
+
+def adaptive_degree_order(indptr, indices, candidates=None):
+    """
+    Adaptive intentional attack: repeatedly remove the node with the highest degree in the
+    remaining graph. Degrees of neighbours are updated in a bucket queue, so the whole order
+    costs O(N + E).
+
+    :param indptr: CSR index pointer
+    :param indices: CSR neighbours
+    :param candidates: nodes which may be removed (default all), the other nodes stay in the graph
+    :return: np.array of removed nodes in order
+    """
+    N = len(indptr) - 1
+    if candidates is None:
+        candidates = np.arange(N)
+    queue = DegreeBucketQueue(np.diff(indptr), candidates)
+
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    removed = [False] * N
+    order = []
+    while queue.size > 0:
+        v = queue.pop_max()
+        removed[v] = True
+        order.append(v)
+        for u in indices[indptr[v]:indptr[v + 1]]:
+            if not removed[u]:
+                queue.decrement(u)
+    return np.array(order, dtype=np.int64)
+
+
+def adjacency_matrix(indptr, indices, active=None):
+    """
+    scipy.sparse adjacency matrix of the graph induced by the `active` nodes (default all)
+    """
+    N = len(indptr) - 1
+    if active is not None:
+        rows = np.repeat(np.arange(N), np.diff(indptr))
+        keep = active[rows] & active[indices]
+        indptr = np.concatenate([[0], np.cumsum(keep)])[indptr]
+        indices = indices[keep]
+    return csr_matrix((np.ones(len(indices)), indices, indptr), shape=(N, N))
+
+
+def recomputed_order(score, N: int, candidates=None, recompute=None):
+    """
+    Nodes ordered by the highest score, with the scores of the remaining graph recomputed after every
+    `recompute` removed nodes
+
+    :param score: function (active, previous scores) -> scores of all nodes, `active` is the boolean
+        mask of nodes in the remaining graph, previous scores are None at the first call
+    :param N: number of nodes
+    :param candidates: nodes which may be removed (default all), the other nodes stay in the graph
+    :param recompute: number of removed nodes between recomputations (None is the static order)
+    :return: np.array of removed nodes in order, ties keep the vertex order
+    """
+    if candidates is None:
+        candidates = np.arange(N)
+    candidates = np.asarray(candidates)
+    if recompute is None:
+        recompute = max(len(candidates), 1)
+    active = np.ones(N, dtype=bool)
+    remaining = np.zeros(N, dtype=bool)
+    remaining[candidates] = True
+    scores = None
+    order = []
+    while remaining.any():
+        scores = score(active, scores)
+        left = np.flatnonzero(remaining)
+        top = left[np.argsort(-scores[left], kind='stable')[:recompute]]
+        order.append(top)
+        active[top] = False
+        remaining[top] = False
+    return np.concatenate(order) if order else np.empty(0, dtype=np.int64)
+
+
+def default_recompute(N: int, adaptive):
+    """
+    Recompute scores after every 1% of nodes for adaptive attacks, never for static ones
+    """
+    return max(1, N // 100) if adaptive else None
+
+
+def bfs_levels(A, source: int):
+    """
+    BFS distance of every node from the source, with the BFS of scipy.sparse.csgraph
+
+    :param A: symmetric scipy.sparse adjacency matrix
+    :return: array of N, -2 for unreachable nodes (never one level away from any node)
+    """
+    N = A.shape[0]
+    order, predecessors = breadth_first_order(A, source, directed=True)
+    # Parents of nodes in the BFS order are in the BFS order too, so the level d + 1 starts at the first
+    # node whose parent is not before the level d
+    position = np.empty(N, dtype=np.int64)
+    position[order] = np.arange(len(order))
+    parent_position = position[predecessors[order[1:]]]
+    bounds = [0, 1]
+    while bounds[-1] < len(order):
+        bounds.append(int(np.searchsorted(parent_position, bounds[-1])) + 1)
+    level = np.full(N, -2, dtype=np.int32)
+    level[order] = np.repeat(np.arange(len(bounds) - 1, dtype=np.int32), np.diff(bounds))
+    return level
+
+
+def dependencies(indptr, indices, active=None, sources=None):
+    """
+    Sum of Brandes' dependencies of the given sources on every node. The BFS runs in scipy.sparse.csgraph
+    (see `bfs_levels`), the numbers of shortest paths and the dependencies are then accumulated level by
+    level over the edges of the shortest-path DAG only.
+
+    :param active: boolean mask of nodes in the graph (default all)
+    :param sources: sources of shortest paths (default all active nodes)
+    :return: array of N (pairs counted in both directions)
+    """
+    N = len(indptr) - 1
+    A = adjacency_matrix(indptr, indices, active)
+    if sources is None:
+        sources = np.arange(N) if active is None else np.flatnonzero(active)
+    # Every edge between active nodes once, it is in the DAG of a source if its ends are one level apart
+    tail = np.repeat(np.arange(N, dtype=A.indices.dtype), np.diff(A.indptr))
+    once = tail < A.indices
+    u, v = tail[once], A.indices[once]
+
+    total = np.zeros(N)
+    for source in sources:
+        level = bfs_levels(A, source)
+        step = level[v] - level[u]
+        dag = np.flatnonzero(np.abs(step) == 1)
+        forward = step[dag] == 1
+        parent = np.where(forward, u[dag], v[dag])
+        child = np.where(forward, v[dag], u[dag])
+        depth = level[child]
+        # Radix sort of small integers
+        order = np.argsort(depth.astype(np.uint16) if depth.max(initial=0) < 2 ** 16 else depth, kind='stable')
+        parent, child = parent[order], child[order]
+        bounds = np.searchsorted(depth[order], np.arange(1, depth.max(initial=0) + 2))
+
+        sigma = np.zeros(N)
+        sigma[source] = 1
+        for d in range(len(bounds) - 1):
+            at_level = slice(bounds[d], bounds[d + 1])
+            np.add.at(sigma, child[at_level], sigma[parent[at_level]])
+        # Accumulation of dependencies from the deepest level
+        delta = np.zeros(N)
+        for d in range(len(bounds) - 2, -1, -1):
+            p, c = parent[bounds[d]:bounds[d + 1]], child[bounds[d]:bounds[d + 1]]
+            np.add.at(delta, p, sigma[p] / sigma[c] * (1 + delta[c]))
+        delta[source] = 0
+        total += delta
+    return total
+
+
+def betweenness(indptr, indices, active=None, sources=None):
+    """
+    Betweenness centrality by Brandes' algorithm (see `dependencies`). For a sample of sources the
+    result is scaled by the number of nodes over the number of sources (unbiased estimate).
+
+    :param active: boolean mask of nodes in the graph (default all)
+    :param sources: sources of shortest paths (default all active nodes)
+    :return: array of N, unnormalised with every pair of nodes counted once
+    """
+    N = len(indptr) - 1
+    n_active = N if active is None else int(np.count_nonzero(active))
+    n_sources = n_active if sources is None else len(sources)
+    return dependencies(indptr, indices, active, sources) * (n_active / max(n_sources, 1)) / 2
+
+
+def betweenness_order(indptr, indices, candidates=None, adaptive=False, n_samples=None, recompute=None, rng=None):
+    """
+    Nodes ordered by betweenness, exact or estimated from `n_samples` random sources per computation
+
+    :param n_samples: number of sampled sources (None is exact, O(N E) per computation)
+    :param recompute: removed nodes between recomputations of the adaptive attack (default 1% of nodes)
+    :param rng: np.random.Generator (default global NumPy RNG)
+    """
+    N = len(indptr) - 1
+    rng = np.random if rng is None else rng
+
+    def score(active, _):
+        sources = None
+        if n_samples is not None:
+            alive = np.flatnonzero(active)
+            sources = rng.choice(alive, min(n_samples, len(alive)), replace=False)
+        return betweenness(indptr, indices, active, sources)
+
+    return recomputed_order(score, N, candidates, recompute or default_recompute(N, adaptive))
+
+
+def core_numbers(indptr, indices, active=None):
+    """
+    k-core index of every node (0 for inactive nodes), by peeling all nodes of degree <= k at once
+
+    :param active: boolean mask of nodes in the graph (default all)
+    """
+    N = len(indptr) - 1
+    alive = np.ones(N, dtype=bool) if active is None else active.copy()
+    rows = np.repeat(np.arange(N), np.diff(indptr))
+    degree = np.bincount(rows[alive[rows] & alive[indices]], minlength=N)
+    core = np.zeros(N, dtype=np.int64)
+    k = 0
+    while alive.any():
+        k = max(k, int(degree[alive].min()))
+        while True:
+            peel = np.flatnonzero(alive & (degree <= k))
+            if len(peel) == 0:
+                break
+            core[peel] = k
+            alive[peel] = False
+            # Neighbours of the peeled nodes lose one degree per edge
+            starts, counts = indptr[peel], np.diff(indptr)[peel]
+            entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            degree -= np.bincount(indices[entries], minlength=N)
+        k += 1
+    return core
+
+
+def core_order(indptr, indices, candidates=None, adaptive=False, recompute=None):
+    """
+    Nodes ordered by k-core index, ties by degree
+    """
+    N = len(indptr) - 1
+
+    def score(active, _):
+        core = core_numbers(indptr, indices, active)
+        degree = np.bincount(np.repeat(np.arange(N), np.diff(indptr)), weights=active[indices], minlength=N)
+        # Degree is below N, so it only breaks the ties of the core index
+        return core * float(N) + degree
+
+    return recomputed_order(score, N, candidates, recompute or default_recompute(N, adaptive))
+
+
+def collective_influence(indptr, indices, active=None, radius=2):
+    """
+    Collective influence CI(i) = (k_i - 1) sum_{j at distance radius from i} (k_j - 1)
+    (Morone and Makse, Nature 524, 65 (2015))
+
+    :param active: boolean mask of nodes in the graph (default all)
+    """
+    N = len(indptr) - 1
+    A = adjacency_matrix(indptr, indices, active)
+    excess = np.maximum(np.asarray(A.sum(axis=1)).ravel() - 1, 0)
+    # Nodes within distance `radius` (boolean sparse powers), the boundary is the last shell
+    step = (A + csr_matrix((np.ones(N), (np.arange(N), np.arange(N))), shape=(N, N))).astype(bool)
+    inner = csr_matrix((np.ones(N, dtype=bool), (np.arange(N), np.arange(N))), shape=(N, N))
+    ball = step if radius >= 1 else inner
+    for _ in range(radius - 1):
+        inner = ball
+        ball = (ball @ step).astype(bool)
+    boundary = (ball.astype(np.int8) - inner.astype(np.int8)).astype(bool)
+    ci = excess * (boundary @ excess)
+    if active is not None:
+        ci[~active] = 0
+    return ci
+
+
+def collective_influence_order(indptr, indices, candidates=None, adaptive=False, radius=2, recompute=None):
+    """
+    Nodes ordered by collective influence of the given radius
+    """
+    N = len(indptr) - 1
+    return recomputed_order(lambda active, _: collective_influence(indptr, indices, active, radius), N, candidates,
+                            recompute or default_recompute(N, adaptive))
+
+
+def pagerank(indptr, indices, active=None, damping=0.85, tol=1e-10, max_iter=1000, x0=None):
+    """
+    PageRank by power iteration, the rank of dangling nodes is spread uniformly
+
+    :param active: boolean mask of nodes in the graph (default all)
+    :param x0: initial vector (e.g. PageRank before the last removals)
+    """
+    N = len(indptr) - 1
+    active = np.ones(N, dtype=bool) if active is None else active
+    n = max(int(np.count_nonzero(active)), 1)
+    A = adjacency_matrix(indptr, indices, active)
+    degree = np.asarray(A.sum(axis=1)).ravel()
+    dangling = active & (degree == 0)
+    x = np.where(active, 1. / n, 0) if x0 is None else np.where(active, x0, 0)
+    x /= max(x.sum(), np.finfo(float).tiny)
+    for _ in range(max_iter):
+        y = damping * (A @ np.divide(x, degree, out=np.zeros(N), where=degree > 0))
+        y += np.where(active, (damping * x[dangling].sum() + 1 - damping) / n, 0)
+        if np.abs(y - x).sum() < n * tol:
+            return y
+        x = y
+    return x
+
+
+def pagerank_order(indptr, indices, candidates=None, adaptive=False, damping=0.85, recompute=None):
+    """
+    Nodes ordered by PageRank, an adaptive recomputation starts from the previous vector
+    """
+    N = len(indptr) - 1
+    return recomputed_order(lambda active, previous: pagerank(indptr, indices, active, damping, x0=previous), N,
+                            candidates, recompute or default_recompute(N, adaptive))
+
+
+def bridge_order(indptr, indices, candidates=None, adaptive=False, bridge_edges=None):
+    """
+    Nodes ordered by the number of their links between communities (e.g. the stable edges of HRG),
+    initial ties by degree. The adaptive attack updates the numbers in a bucket queue after every removal.
+
+    :param bridge_edges: array of shape (B, 2) of the links between communities
+    """
+    if bridge_edges is None:
+        raise ValueError('Bridge targeting needs the links between communities (bridge_edges)')
+    N = len(indptr) - 1
+    if candidates is None:
+        candidates = np.arange(N)
+    bridge_edges = np.asarray(bridge_edges, dtype=np.int64).reshape(-1, 2)
+    bridges = np.bincount(bridge_edges.ravel(), minlength=N)
+    by_degree = static_degree_order(indptr, candidates)
+    if not adaptive:
+        return by_degree[np.argsort(-bridges[by_degree], kind='stable')]
+
+    # Equal numbers of bridges are popped in the order of degree
+    queue = DegreeBucketQueue(bridges, by_degree)
+    src = np.concatenate([bridge_edges[:, 0], bridge_edges[:, 1]])
+    dst = np.concatenate([bridge_edges[:, 1], bridge_edges[:, 0]])
+    neighbours = np.split(dst[np.argsort(src, kind='stable')], np.cumsum(bridges)[:-1])
+    removed = [False] * N
+    order = []
+    while queue.size > 0:
+        v = queue.pop_max()
+        removed[v] = True
+        order.append(v)
+        for u in neighbours[v].tolist():
+            if not removed[u]:
+                queue.decrement(u)
+    return np.array(order, dtype=np.int64)
+
+
+def degree_order(indptr, indices, candidates=None, adaptive=False):
+    """
+    Nodes ordered by degree (`static_degree_order` or `adaptive_degree_order`)
+    """
+    if adaptive:
+        return adaptive_degree_order(indptr, indices, candidates)
+    return static_degree_order(indptr, candidates)
+
+
+STRATEGIES = {
+    'degree': degree_order,
+    'betweenness': betweenness_order,
+    'betweenness_sampled': partial(betweenness_order, n_samples=256),
+    'kcore': core_order,
+    'collective_influence': collective_influence_order,
+    'pagerank': pagerank_order,
+    'bridge': bridge_order,
+}
+
+
+def strategy_order(strategy, indptr, indices, candidates=None, adaptive=False, **kwargs):
+    """
+    Removal order of a targeted attack
+
+    :param strategy: name from STRATEGIES or a function (indptr, indices, candidates, adaptive) -> order,
+        e.g. partial(betweenness_order, n_samples=1000)
+    :param kwargs: arguments of the strategy (`bridge_edges` of 'bridge')
+    """
+    if not callable(strategy):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy: {strategy}')
+        strategy = STRATEGIES[strategy]
+    return strategy(indptr, indices, candidates, adaptive, **kwargs)
@@ -1,6 +1,19 @@
+import hashlib
+import json
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection
+from scipy.sparse import coo_matrix, diags
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh
+
+sys.path.append('..')
+from scripts.results_store import ResultsStore
 
 COLORS = ['red', 'green', 'blue', 'black', 'grey', 'orange', 'black']
 COLORS = ['xkcd:' + c for c in COLORS]
@@ -39,7 +52,7 @@ def save_figure(filename: str):
 def draw_network(g: nx.Graph, ax=None, pos=None, node_size_list=None, node_size_scale=10,
                  edge_alpha=0.1, node_border_color='black', node_border_width=0.5):
     """
-    Draw nx.Graph on matplotlib axis
+    Draw nx.Graph on matplotlib axis (every edge is a patch, for large graphs use `draw_large_network`)
     :param g: nx.Graph
     :param ax: matplotlib canvas
     :param pos: position of nodes (e.g. from nx.spring_layout(g))
@@ -61,17 +74,239 @@ def degree_node_size(g: nx.Graph, scale=10):
     return [scale * v for v in dict(g.degree).values()]
 
 
+def layout_key(edges, N: int, community, method: str, seed) -> str:
+    h = hashlib.sha256(json.dumps({'N': N, 'method': method, 'seed': seed}).encode())
+    h.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+    if community is not None:
+        h.update(np.ascontiguousarray(community, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def community_layout(edges, N: int, community, seed=None):
+    """
+    Layout driven by community labels (e.g. `hrg.hrg_communities`): communities are placed by a spring
+    layout of the graph of communities weighted by the links between them, and nodes uniformly in a disc
+    of area proportional to the size of their community. Takes O(N + E) apart from the small spring layout.
+
+    :return: np.array of shape (N, 2)
+    """
+    labels, inverse, sizes = np.unique(np.asarray(community), return_inverse=True, return_counts=True)
+    C = len(labels)
+    a, b = inverse[edges[:, 0]], inverse[edges[:, 1]]
+    between = a != b
+    weights = coo_matrix((np.ones(np.count_nonzero(between)), (a[between], b[between])), shape=(C, C)).tocsr()
+    quotient = nx.Graph()
+    quotient.add_nodes_from(range(C))
+    quotient.add_weighted_edges_from((i, j, w) for (i, j), w in weights.todok().items())
+    centres = nx.spring_layout(quotient, weight='weight', seed=seed)
+    centres = np.array([centres[i] for i in range(C)])
+
+    radius = np.sqrt(sizes / sizes.max())
+    if C > 1:
+        distance = np.linalg.norm(centres[:, None] - centres[None], axis=-1)
+        radius *= 0.45 * distance[~np.eye(C, dtype=bool)].min()
+    rng = np.random.default_rng(seed)
+    r = radius[inverse] * np.sqrt(rng.random(N))
+    theta = 2 * np.pi * rng.random(N)
+    return centres[inverse] + r[:, None] * np.column_stack([np.cos(theta), np.sin(theta)])
+
+
+def spectral_layout(edges, N: int, seed=None):
+    """
+    Layout of the largest component by its two leading non-trivial eigenvectors of the normalised
+    adjacency matrix (sparse eigensolver, scales to large graphs without community labels). Every other
+    component would add its own eigenvalue 1, so they are placed separately: in discs on a ring around
+    the largest component, with the area of a disc proportional to the size of its component.
+
+    :return: np.array of shape (N, 2)
+    """
+    A = coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(N, N)).tocsr()
+    A = A + A.T
+    _, labels = connected_components(A, directed=False)
+    sizes = np.bincount(labels)
+    largest = sizes.argmax()
+    giant = np.flatnonzero(labels == largest)
+    rng = np.random.default_rng(seed)
+    pos = np.zeros((N, 2))
+    if len(giant) > 3:
+        G = A[giant][:, giant]
+        scale = diags(1 / np.sqrt(np.asarray(G.sum(axis=1)).ravel()))
+        _, vectors = eigsh(scale @ G @ scale, k=3, which='LA', v0=rng.random(len(giant)))
+        giant_pos = scale @ vectors[:, :2]
+        pos[giant] = giant_pos / np.abs(giant_pos).max()
+    else:
+        pos[giant] = rng.random((len(giant), 2)) * 2 - 1
+
+    small = np.flatnonzero(labels != largest)
+    if len(small):
+        others = np.flatnonzero(np.arange(len(sizes)) != largest)
+        radius = np.sqrt(sizes[others] / len(giant))
+        # Centres along the ring, every disc takes an arc of its diameter
+        arc = np.cumsum(2 * radius) - radius
+        circumference = 2 * radius.sum()
+        ring = max(1.5, circumference / (2 * np.pi))
+        theta = 2 * np.pi * arc / circumference
+        centres = (ring + radius[:, None]) * np.column_stack([np.cos(theta), np.sin(theta)])
+        component = np.zeros(len(sizes), dtype=np.int64)
+        component[others] = np.arange(len(others))
+        c = component[labels[small]]
+        r = radius[c] * np.sqrt(rng.random(len(small)))
+        theta = 2 * np.pi * rng.random(len(small))
+        pos[small] = centres[c] + r[:, None] * np.column_stack([np.cos(theta), np.sin(theta)])
+    return pos / np.abs(pos).max()
+
+
+def layout(edges, N: int, community=None, method=None, seed=None, cache_dir=None):
+    """
+    Positions of nodes of a large graph, cached in `cache_dir` (one .npy per graph, method and seed)
+
+    :param edges: array of shape (E, 2)
+    :param community: community labels of nodes (required by 'community')
+    :param method: 'community', 'spectral' or 'spring' (nx.spring_layout, small graphs only), default
+        'community' if labels are given, else 'spring' up to 5000 nodes and 'spectral' above
+    :return: np.array of shape (N, 2)
+    """
+    edges = np.asarray(edges).reshape(-1, 2)
+    if method is None:
+        method = 'community' if community is not None else 'spring' if N <= 5000 else 'spectral'
+    path = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, layout_key(edges, N, community, method, seed) + '.npy')
+        if os.path.exists(path):
+            return np.load(path)
+
+    if method == 'community':
+        pos = community_layout(edges, N, community, seed)
+    elif method == 'spectral':
+        pos = spectral_layout(edges, N, seed)
+    elif method == 'spring':
+        g = nx.Graph()
+        g.add_nodes_from(range(N))
+        g.add_edges_from(edges.tolist())
+        positions = nx.spring_layout(g, seed=seed)
+        pos = np.array([positions[v] for v in range(N)])
+    else:
+        raise ValueError(f'Unknown layout method: {method}')
+
+    if path is not None:
+        tmp = path[:-len('.npy')] + '.tmp.npy'
+        np.save(tmp, pos)
+        os.replace(tmp, path)
+    return pos
+
+
+def draw_edges(pos, edges, ax=None, mode='lines', color='black', alpha=0.05, linewidth=0.3, bins=800,
+               cmap='Greys', samples=16, chunk=2 ** 18):
+    """
+    Draw all edges at once: 'lines' as a single rasterised LineCollection, 'density' as a rasterised
+    histogram of points along the edges (log scale)
+
+    :param pos: np.array of shape (N, 2)
+    :param samples: points per edge of 'density'
+    :param chunk: edges processed at once by 'density'
+    """
+    if ax is None:
+        ax = plt.gca()
+    edges = np.asarray(edges).reshape(-1, 2)
+    if mode == 'lines':
+        lines = LineCollection(pos[edges], colors=color, alpha=alpha, linewidths=linewidth, rasterized=True,
+                               zorder=0)
+        ax.add_collection(lines)
+        ax.autoscale_view()
+        return lines
+    elif mode == 'density':
+        low, high = pos.min(axis=0), pos.max(axis=0)
+        histogram = np.zeros((bins, bins))
+        t = np.linspace(0, 1, samples)[None, :, None]
+        for start in range(0, len(edges), chunk):
+            e = edges[start:start + chunk]
+            points = (pos[e[:, 0]][:, None] + t * (pos[e[:, 1]] - pos[e[:, 0]])[:, None]).reshape(-1, 2)
+            histogram += np.histogram2d(points[:, 0], points[:, 1], bins=bins,
+                                        range=[[low[0], high[0]], [low[1], high[1]]])[0]
+        return ax.imshow(np.log1p(histogram.T), origin='lower', extent=(low[0], high[0], low[1], high[1]),
+                         cmap=cmap, interpolation='nearest', aspect='auto', zorder=0)
+    raise ValueError(f'Unknown edge mode: {mode}')
+
+
+def draw_large_network(edges, N: int, ax=None, pos=None, community=None, node_size=1., node_color='black',
+                       edge_mode='lines', edge_alpha=0.05, cmap='tab10', cache_dir=None, seed=None):
+    """
+    Draw a large graph (e.g. HRG with 80k nodes) in seconds: nodes as one scatter and edges by
+    `draw_edges`, rasterised
+
+    :param edges: array of shape (E, 2), e.g. CSRGraph.edges
+    :param community: community labels of nodes, used for the layout and node colours
+    :param pos: positions of nodes, default `layout(edges, N, community, cache_dir=cache_dir, seed=seed)`
+    :param edge_mode: 'lines' or 'density'
+    :return: positions of nodes
+    """
+    if ax is None:
+        ax = plt.gca()
+    if pos is None:
+        pos = layout(edges, N, community, seed=seed, cache_dir=cache_dir)
+    draw_edges(pos, edges, ax, edge_mode, alpha=edge_alpha)
+    ax.scatter(pos[:, 0], pos[:, 1], s=node_size, c=node_color if community is None else community, cmap=cmap,
+               linewidths=0, rasterized=True)
+    ax.set_aspect('equal')
+    ax.set_axis_off()
+    return pos
+
+
+def aggregate_curves(curves):
+    """
+    Mean and std of N*/N over realisations in one pass (O(len(ps)) memory), NaN entries (missing values)
+    are not counted
+    """
+    n = total = total_squares = None
+    for curve in curves:
+        curve = np.asarray(curve, dtype=float)
+        if n is None:
+            n, total, total_squares = np.zeros(len(curve)), np.zeros(len(curve)), np.zeros(len(curve))
+        valid = ~np.isnan(curve)
+        curve = np.where(valid, curve, 0)
+        n += valid
+        total += curve
+        total_squares += curve ** 2
+    mean = total / np.maximum(n, 1)
+    return mean, np.sqrt(np.maximum(total_squares / np.maximum(n, 1) - mean ** 2, 0))
+
+
+def curve_mean_std(d):
+    """
+    (ps, mean, std) of a curve given as a DataFrame/dict with 'mean' and 'std' (ps None), a CSV of
+    `save_output`, a ResultsStore or its directory (aggregated lazily, ps from its metadata) or an array of
+    shape (ntimes, len(ps)) of single realisations
+    """
+    if isinstance(d, str):
+        d = ResultsStore(d) if os.path.isdir(d) else pd.read_csv(d)
+    if isinstance(d, ResultsStore):
+        mean, std = aggregate_curves(d.iter_load())
+        return d.meta().get('ps'), mean, std
+    if isinstance(d, (pd.DataFrame, dict)):
+        return None, np.asarray(d['mean']), np.asarray(d['std'])
+    d = np.asarray(d, dtype=float)
+    mean, std = aggregate_curves(d)
+    return None, mean, std
+
+
 def plot_giant_connected_component_vs_removed(data, labels, colors=None, ylabel=True, xlabel=True, legend=True,
                                               new_fig=True, error_alpha=0.2, **args):
+    """
+    :param data: curves in any format of `curve_mean_std`, raw results are aggregated one at a time while
+        plotting
+    """
     if colors is None:
         colors = COLORS
-    ps = np.linspace(0, 1, len(data[0]))
 
     if new_fig:
         plt.figure(figsize=(8, 6))
     plt.grid(alpha=0.1)
     for d, c, l in zip(data, colors, labels):
-        markers, caps, bars = plt.errorbar(ps, d['mean'], d['std'], color=c, label=l, fmt='-')
+        ps, mean, std = curve_mean_std(d)
+        if ps is None:
+            ps = np.linspace(0, 1, len(mean))
+        markers, caps, bars = plt.errorbar(ps, mean, std, color=c, label=l, fmt='-')
         [bar.set_alpha(error_alpha) for bar in bars]
         [cap.set_alpha(error_alpha) for cap in caps]
 